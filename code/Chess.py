@@ -1,17 +1,64 @@
-import pygame
-import os
+from bitboard import (BB_EMPTY, BB_ALL, BB_SQUARES, BB_RANK_1, BB_RANK_3, BB_RANK_6, BB_RANK_8, BB_FILE_A, BB_FILE_H,
+                      BB_LIGHT_SQUARES, BB_DARK_SQUARES, SQUARE_COORDS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+                      BETWEEN, LINE,
+                      square, lsb, scan_forward, rook_attacks, bishop_attacks)
+from zobrist import ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT
 
 
 RANK_NAMES = ["1", "2", "3", "4", "5", "6", "7", "8"]
 FILE_NAMES = ["a", "b", "c", "d", "e", "f", "g", "h"]
 SQUARE_NAMES = [[f + r for f in FILE_NAMES] for r in RANK_NAMES[::-1]]
+SQUARE_NUMBERS = {name: square(col, row) for row, names in enumerate(SQUARE_NAMES) for col, name in enumerate(names)}
 STANDARD_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 0"
-PIECE_IMAGE = {}
+PIECE_SYMBOLS = "PNBRQKpnbrqk"
+
+# game results; the code of a result is its index, binformat game files and position_index entries store codes
+RESULT_UNFINISHED, RESULT_WHITE, RESULT_BLACK, RESULT_DRAW = "*", "1-0", "0-1", "1/2-1/2"
+RESULTS = (RESULT_UNFINISHED, RESULT_WHITE, RESULT_BLACK, RESULT_DRAW)
+UNFINISHED_CODE, WHITE_WIN_CODE, BLACK_WIN_CODE, DRAW_CODE = range(len(RESULTS))
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+
+# castling rights bitmask
+WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE = 1, 2, 4, 8
+CASTLING_SYMBOLS = {'K': WHITE_KING_SIDE, 'Q': WHITE_QUEEN_SIDE, 'k': BLACK_KING_SIDE, 'q': BLACK_QUEEN_SIDE}
+# rights kept after a move from or to a square: touching a king or rook home square loses the matching rights
+CASTLING_KEEP = [15] * 64
+CASTLING_KEEP[square(4, 7)] = 15 & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)
+CASTLING_KEEP[square(7, 7)] = 15 & ~WHITE_KING_SIDE
+CASTLING_KEEP[square(0, 7)] = 15 & ~WHITE_QUEEN_SIDE
+CASTLING_KEEP[square(4, 0)] = 15 & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)
+CASTLING_KEEP[square(7, 0)] = 15 & ~BLACK_KING_SIDE
+CASTLING_KEEP[square(0, 0)] = 15 & ~BLACK_QUEEN_SIDE
+
+# piece codes: the piece type in the low 3 bits, BLACK set for black pieces, 0 is an empty square
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+BLACK = 8
+CODE_SYMBOLS = ['.'] * 15
+for _piece_type, _symbol in enumerate("PNBRQK", 1):
+    CODE_SYMBOLS[_piece_type] = _symbol
+    CODE_SYMBOLS[_piece_type | BLACK] = _symbol.lower()
+SYMBOL_CODES = {symbol: code for code, symbol in enumerate(CODE_SYMBOLS) if symbol != '.'}
+PIECE_CODES = tuple(SYMBOL_CODES[s] for s in PIECE_SYMBOLS)
+PROMOTION_TYPES = {'n': KNIGHT, 'b': BISHOP, 'r': ROOK, 'q': QUEEN}
+PROMOTION_SYMBOLS = {piece_type: symbol for symbol, piece_type in PROMOTION_TYPES.items()}
+_ZOBRIST_CODES = [ZOBRIST_PIECES.get(symbol) for symbol in CODE_SYMBOLS]
+
+# packed move: from 0-5, to 6-11, promotion piece type 12-14, flags 15-17, captured piece code 18-21
+MOVE_CAPTURE = 1 << 15
+MOVE_EN_PASSANT = 1 << 16
+MOVE_CASTLING = 1 << 17
+MOVE_KEY_MASK = 0x7FFF # from, to and promotion: enough to tell the legal moves of a position apart
+_PROMOTION_SHIFTS = tuple(piece_type << 12 for piece_type in (QUEEN, ROOK, KNIGHT, BISHOP))
+
+CASTLING_STRINGS = [''.join(symbol for symbol, right in CASTLING_SYMBOLS.items() if rights & right) or '-'
+                    for rights in range(16)]
+# king and rook home squares every castling right needs
+_CASTLING_PIECES = {WHITE_KING_SIDE: ((square(4, 7), KING), (square(7, 7), ROOK)),
+                    WHITE_QUEEN_SIDE: ((square(4, 7), KING), (square(0, 7), ROOK)),
+                    BLACK_KING_SIDE: ((square(4, 0), KING | BLACK), (square(7, 0), ROOK | BLACK)),
+                    BLACK_QUEEN_SIDE: ((square(4, 0), KING | BLACK), (square(0, 0), ROOK | BLACK))}
+_DIGITS = "012345678"
 
-for image_name in os.listdir("..\\images\\pieces"):
-    color, piece_type = image_name[0], image_name[1]
-    PIECE_IMAGE[piece_type[0] if color == 'b' else piece_type[0].upper()] = pygame.image.load(f"..\\images\\pieces\\{image_name}")
-    
 def coord_to_str(column: int, row: int) -> str:
     return SQUARE_NAMES[row][column]
 
@@ -22,11 +69,159 @@ def str_to_coord(pos: str):
     return [col, row]
 
 
+# piece counts of a rank, 7 bits each: white kings, black kings, white pawns, black pawns, white pieces, black pieces
+_COUNT_SHIFTS = {KING: 0, KING | BLACK: 7, PAWN: 14, PAWN | BLACK: 21}
+# (row, rank text) -> (piece codes, zobrist of its pieces, packed counts, (code, bitboard) pairs) of the ranks read before
+_RANKS = {}
+
+def _parse_rank(row: int, text: str, fen: str) -> tuple:
+    cached = _RANKS.get((row, text))
+    if cached:
+        return cached
+    codes = []
+    for ch in text:
+        if ch in _DIGITS and ch != '0':
+            codes += [EMPTY] * (ord(ch) - 48)
+            continue
+        code = SYMBOL_CODES.get(ch)
+        if code is None:
+            raise Exception(f"Invalid FEN, unknown piece {ch}: {fen}")
+        if code & 7 == PAWN and row in (0, 7):
+            raise Exception(f"Invalid position, pawn on the first or last rank: {fen}")
+        codes.append(code)
+    if len(codes) != 8:
+        raise Exception(f"Invalid FEN, rank {8 - row} is not 8 squares: {fen}")
+    key = counts = 0
+    masks = {}
+    for col, code in enumerate(codes):
+        if code:
+            key ^= _ZOBRIST_CODES[code][row * 8 + col]
+            counts += (1 << _COUNT_SHIFTS[code] if code in _COUNT_SHIFTS else 0) + (1 << (35 if code & BLACK else 28))
+            masks[code] = masks.get(code, BB_EMPTY) | BB_SQUARES[row * 8 + col]
+    if len(_RANKS) > 1 << 16:
+        _RANKS.clear()
+    cached = _RANKS[(row, text)] = (tuple(codes), key, counts, tuple(masks.items()))
+    return cached
+
+def parse_fen(fen: str) -> tuple:
+    """
+        Reads and validates a FEN in one pass over its fields. Returns (squares, white to move, castling rights,
+        en passant square or None, half moves, full moves); the clocks may be left out and default to 0 and 1.
+        Raises on the first problem found.
+    """
+    squares, _, _, *state = _parse_fen(fen)
+    return (squares, *state)
+
+def fen_key(fen: str) -> int:
+    """ Board(fen).zobrist without building the Board (the side not to move is not checked for check)."""
+    squares, key, _, white_to_move, castling, ep_square, _, _ = _parse_fen(fen)
+    key ^= ZOBRIST_CASTLING[castling]
+    if not white_to_move:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    if ep_square is not None:
+        pawn = PAWN if white_to_move else PAWN | BLACK
+        if any(squares[sq] == pawn for sq in scan_forward(PAWN_ATTACKS[not white_to_move][ep_square])):
+            key ^= ZOBRIST_EN_PASSANT[ep_square & 7]
+    return key
+
+def _parse_fen(fen: str) -> tuple:
+    """ parse_fen with the zobrist key of the pieces and the (piece code, bitboard) pairs after the squares."""
+    fields = fen.split()
+    if not 4 <= len(fields) <= 6:
+        raise Exception(f"Invalid FEN, expected 6 fields: {fen}")
+    ranks = fields[0].split('/')
+    if len(ranks) != 8:
+        raise Exception(f"Invalid FEN, expected 8 ranks: {fen}")
+    squares, masks = [], []
+    key = counts = 0
+    for row, text in enumerate(ranks):
+        codes, rank_key, rank_counts, rank_masks = _parse_rank(row, text, fen)
+        squares += codes
+        key ^= rank_key
+        counts += rank_counts
+        masks += rank_masks
+    if counts & 0x3FFF != 1 | 1 << 7:
+        raise Exception(f"Invalid position, each side needs one king: {fen}")
+    if counts >> 14 & 127 > 8 or counts >> 21 & 127 > 8 or counts >> 28 & 127 > 16 or counts >> 35 > 16:
+        raise Exception(f"Invalid position, too many pieces: {fen}")
+
+    if fields[1] not in ('w', 'b'):
+        raise Exception(f"Invalid FEN, side to move must be w or b: {fen}")
+    white_to_move = fields[1] == 'w'
+
+    castling = 0
+    if fields[2] != '-':
+        for ch in fields[2]:
+            right = CASTLING_SYMBOLS.get(ch)
+            if right is None or castling & right:
+                raise Exception(f"Invalid FEN, bad castling field: {fen}")
+            if any(squares[home] != code for home, code in _CASTLING_PIECES[right]):
+                raise Exception(f"Invalid position, castling right {ch} without king and rook at home: {fen}")
+            castling |= right
+
+    ep_square = None
+    if fields[3] != '-':
+        ep_square = SQUARE_NUMBERS.get(fields[3], -1)
+        # the target is behind a pawn that has just moved two squares
+        step = 8 if white_to_move else -8
+        if ep_square >> 3 != (2 if white_to_move else 5) or squares[ep_square] or squares[ep_square - step] \
+        or squares[ep_square + step] != (PAWN | BLACK if white_to_move else PAWN):
+            raise Exception(f"Invalid position, bad en passant square: {fen}")
+
+    clocks = fields[4:]
+    if not all(field.isdigit() for field in clocks):
+        raise Exception(f"Invalid FEN, move counters must be numbers: {fen}")
+    half_moves = int(clocks[0]) if clocks else 0
+    full_moves = int(clocks[1]) if len(clocks) > 1 else 1
+    return squares, key, masks, white_to_move, castling, ep_square, half_moves, full_moves
+
+def board_fen(squares: list) -> str:
+    """ Piece placement field of the FEN of a square list."""
+    text = ""
+    run = 0
+    for sq, code in enumerate(squares):
+        if code:
+            if run:
+                text += _DIGITS[run]
+                run = 0
+            text += CODE_SYMBOLS[code]
+        else:
+            run += 1
+        if sq & 7 == 7:
+            if run:
+                text += _DIGITS[run]
+                run = 0
+            if sq != 63:
+                text += '/'
+    return text
+
+def move_key(move) -> int:
+    """ from | to << 6 | promotion << 12 of a Move or a packed move."""
+    if isinstance(move, int):
+        return move & MOVE_KEY_MASK
+    if move.packed is not None:
+        return move.packed & MOVE_KEY_MASK
+    key = square(*move.from_square) | square(*move.to_square) << 6
+    # an unknown promotion symbol gives a key no legal move has
+    return key | PROMOTION_TYPES.get(move.promotion.lower(), 7) << 12 if move.promotion else key
+
+def uci_key(uci: str) -> int:
+    """ Move key of a uci string, -1 if it does not name two squares and an optional promotion."""
+    from_sq = SQUARE_NUMBERS.get(uci[:2].lower())
+    to_sq = SQUARE_NUMBERS.get(uci[2:4].lower())
+    if from_sq is None or to_sq is None or len(uci) > 5:
+        return -1
+    if len(uci) == 5:
+        if uci[4].lower() not in PROMOTION_TYPES:
+            return -1
+        return from_sq | to_sq << 6 | PROMOTION_TYPES[uci[4].lower()] << 12
+    return from_sq | to_sq << 6
+
+
 class Piece:
+    __slots__ = ('pos', 'piece_symbol', 'color')
+
     def __init__(self, piece_symbol, pos=(0, 0)):
-        self.image = PIECE_IMAGE[piece_symbol]
-        self.img_rect = self.image.get_rect()
-        self.rect = self.img_rect
         self.pos = pos
         self.piece_symbol = piece_symbol
         self.color = 'black'
@@ -41,11 +236,6 @@ class Piece:
     def isBlack(self) -> bool:
         return self.color == 'black'
 
-    def render(self, screen, x, y) -> None:
-        self.img_rect.x = x
-        self.img_rect.y = y
-        screen.blit(self.image, (x, y))
-
     def __bool__(self):
         return True
 
@@ -54,15 +244,32 @@ class Piece:
 
 
 class Move:
-    def __init__(self, from_square: tuple, to_square: tuple, promotion: str=None, capturing: Piece = None, 
+    """ Move as the UI sees it. The board works on packed ints and builds these views from them on demand."""
+    __slots__ = ('from_square', 'to_square', 'promotion', 'capturing', 'castling', 'en_passant_target', 'packed')
+
+    def __init__(self, from_square: tuple,
+                        to_square: tuple,
+                        promotion: str = None,
+                        capturing: str = None,
                         castling: str = None, 
-                        en_passant_target: tuple = None):
+                        en_passant_target: tuple = None,
+                        packed: int = None):
         self.from_square = from_square
         self.to_square = to_square
         self.promotion = promotion # piece symbol
-        self.capturing = capturing
+        self.capturing = capturing # symbol of the captured piece
         self.castling = castling
         self.en_passant_target = en_passant_target
+        self.packed = packed
+
+    @classmethod
+    def from_packed(cls, packed: int) -> 'Move':
+        to_sq = packed >> 6 & 63
+        captured = packed >> 18 & 15
+        castling = ('k' if to_sq & 7 == 6 else 'q') if packed & MOVE_CASTLING else None
+        return cls(SQUARE_COORDS[packed & 63], SQUARE_COORDS[to_sq], PROMOTION_SYMBOLS.get(packed >> 12 & 7),
+                   CODE_SYMBOLS[captured] if captured else None, castling,
+                   SQUARE_COORDS[to_sq] if packed & MOVE_EN_PASSANT else None, packed)
 
     def uci(self) -> str:
         if self.promotion:
@@ -75,374 +282,700 @@ class Move:
 
 class Board:
     def __init__(self, fen: str=STANDARD_FEN, x: int = 0, y: int = 0):
-        self.set_position(fen)
+        if fen is not None: # Board(None) is set up later with set_squares
+            self.set_position(fen)
         self.x: int = x
         self.y: int = y
-        self.move_log : Move = []
         self.gen_plegal_movesFunctions = {
-            'p': self.gen_plegal_pawn_moves,
-            'q': self.gen_plegal_queen_moves,
-            'n': self.gen_plegal_knight_moves,
-            'k': self.gen_plegal_king_moves,
-            'b': self.gen_plegal_bishop_moves,
-            'r': self.gen_plegal_rook_moves,
-            '.': lambda x: x
+            PAWN: self.gen_plegal_pawn_moves,
+            QUEEN: self.gen_plegal_queen_moves,
+            KNIGHT: self.gen_plegal_knight_moves,
+            KING: self.gen_plegal_king_moves,
+            BISHOP: self.gen_plegal_bishop_moves,
+            ROOK: self.gen_plegal_rook_moves,
         }
-        self.plegal_moves = {True: (), False: ()} # True - white, False - black
-        self.legal_moves = self.gen_legal_moves()
         self.flipped = False
 
     def set_position(self, fen: str) -> None:
-        fen = fen.strip().split()
-        if not self.fen_is_valid(fen):
-            raise Exception("Invalid position")
-        if fen == None:
-            return
-        self.grid = [[] for j in range(8)]
-        self.white_to_move: bool = (fen[1] == 'w')
-        self.half_moves: int = int(fen[4])
-        self.full_moves: int = int(fen[5])
-        self.en_passant_target: list[int, int] = str_to_coord(fen[3]) if fen[3] != '-' else None
-        self.rights_to_castle_queen_side = {"white": False, "black": False}
-        self.rights_to_castle_king_side = {"white": False, "black": False}
-        self.castling_rights_log = []
-
-        # piece placement
-        for row, line in enumerate(fen[0].split("/")):
-            col = 0
-            for s in line:
-                if s.isnumeric():
-                    col += int(s)
-                    self.grid[row] += ['.']*int(s)
-                else:
-                    p = Piece(s, pos=(col, row))
-                    if p.piece_symbol == "K":
-                        self.white_king = p
-                    if p.piece_symbol == "k":
-                        self.black_king = p
-                    self.grid[row].append(Piece(s, pos=(col, row)))
-                    col += 1
-        
-        # castling rights
-        for s in fen[2]:
-            if s == "q":
-                self.rights_to_castle_queen_side['black'] = True
-            elif s == "Q":
-                self.rights_to_castle_queen_side['white'] = True
-            elif s == "k":
-                self.rights_to_castle_king_side['black'] = True
-            elif s == "K":
-                self.rights_to_castle_king_side['white'] = True
-
-    def fen_is_valid(self, fen: list) -> bool:
-        white_king_count: int = 0
-        black_king_count: int = 0
-        for row, line in enumerate(fen[0].split("/")):
-            for s in line:
-                if s.isnumeric(): continue
-                white_king_count += int(s == "K")
-                black_king_count += int(s == "k")
-        if white_king_count != 1 or black_king_count != 1:
+        self._set_state(*_parse_fen(fen))
+
+    def set_squares(self, squares: list, white_to_move: bool, castling_rights: int = 0, ep_square: int = None,
+                    half_moves: int = 0, full_moves: int = 1) -> None:
+        """ Sets up the position from 64 piece codes (a8 first) without going through FEN text."""
+        key = 0
+        masks = []
+        for sq, code in enumerate(squares):
+            if code:
+                key ^= _ZOBRIST_CODES[code][sq]
+                masks.append((code, BB_SQUARES[sq]))
+        if list(squares).count(KING) != 1 or list(squares).count(KING | BLACK) != 1:
+            raise Exception("Invalid position, each side needs one king")
+        self._set_state(list(squares), key, masks, white_to_move, castling_rights, ep_square, half_moves, full_moves)
+
+    def _set_state(self, squares: list, key: int, masks: list, white_to_move: bool, castling_rights: int,
+                   ep_square: int, half_moves: int, full_moves: int) -> None:
+        self.zobrist: int = key
+        self.white_to_move: bool = white_to_move
+        self.castling_rights: int = castling_rights
+        self.half_moves: int = half_moves
+        self.full_moves: int = full_moves
+        # piece code per square, bitboards per piece code and per color (True - white, False - black)
+        pieces = [BB_EMPTY] * 15
+        for code, mask in masks:
+            pieces[code] |= mask
+        self.squares: list[int] = squares
+        self.pieces: list[int] = pieces
+        self.occupied_co: list[int] = [pieces[9] | pieces[10] | pieces[11] | pieces[12] | pieces[13] | pieces[14],
+                                       pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5] | pieces[6]]
+        self.occupied = self.occupied_co[0] | self.occupied_co[1]
+        # keys of the positions before every move made, the current key is not included
+        self.zobrist_history: list[int] = []
+        self.en_passant_target: tuple = SQUARE_COORDS[ep_square] if ep_square is not None else None
+        # one (packed move, castling rights, en passant target, half moves, full moves) per move
+        self.undo_log: list[tuple] = []
+        turn = self.white_to_move
+        if self.is_attacked(lsb(self.pieces[KING | BLACK if turn else KING]), turn):
+            raise Exception(f"Invalid position, the side not to move is in check: {board_fen(squares)}")
+        self.zobrist ^= ZOBRIST_CASTLING[self.castling_rights] ^ self._en_passant_key()
+        if not turn:
+            self.zobrist ^= ZOBRIST_BLACK_TO_MOVE
+        self._legal_moves = None # packed, generated on first access
+        self._clear_views()
+
+    def _clear_views(self) -> None:
+        """ Drops everything built from the legal moves or the placement of the previous position."""
+        self._legal_move_views = self._legal_index = self._moves_from = self._grid = self._piece_map = None
+
+    @property
+    def rights_to_castle_king_side(self) -> dict:
+        return {"white": bool(self.castling_rights & WHITE_KING_SIDE), "black": bool(self.castling_rights & BLACK_KING_SIDE)}
+
+    @property
+    def rights_to_castle_queen_side(self) -> dict:
+        return {"white": bool(self.castling_rights & WHITE_QUEEN_SIDE), "black": bool(self.castling_rights & BLACK_QUEEN_SIDE)}
+
+    @property
+    def packed_legal_moves(self) -> list:
+        """ Legal moves as packed ints, what the search and perft work on."""
+        if self._legal_moves is None:
+            self._legal_moves = self.gen_legal_moves()
+        return self._legal_moves
+
+    @property
+    def legal_moves(self) -> list:
+        if self._legal_move_views is None:
+            self._legal_move_views = [Move.from_packed(m) for m in self.packed_legal_moves]
+        return self._legal_move_views
+
+    @property
+    def legal_index(self) -> dict:
+        """ Packed legal moves keyed by their move key (from, to, promotion)."""
+        if self._legal_index is None:
+            self._legal_index = {move & MOVE_KEY_MASK: move for move in self.packed_legal_moves}
+        return self._legal_index
+
+    def is_legal(self, move) -> bool:
+        """ Checks a Move or a packed move against the legal moves of the position."""
+        return move_key(move) in self.legal_index
+
+    def find_move(self, from_square: tuple, to_square: tuple, promotion: str = None) -> Move:
+        """ The legal move between the squares or None."""
+        packed = self.legal_index.get(move_key(Move(from_square, to_square, promotion)))
+        return Move.from_packed(packed) if packed is not None else None
+
+    def moves_from(self, col: int, row: int) -> list:
+        """ Legal moves of the piece on the square."""
+        if self._moves_from is None:
+            self._moves_from = {}
+            for move in self.legal_moves:
+                self._moves_from.setdefault(move.from_square, []).append(move)
+        return self._moves_from.get((col, row), [])
+
+    def book_moves(self, book) -> list:
+        """ (Move, weight) of the legal moves an opening book (book.OpeningBook) has for the position, heaviest first."""
+        moves = []
+        for key, weight in book.weights(self.zobrist):
+            packed = self.legal_index.get(key)
+            if packed is not None: # entries of another position with the same key are not legal here
+                moves.append((Move.from_packed(packed), weight))
+        return moves
+
+    @property
+    def piece_map(self) -> dict:
+        """
+            Piece of every occupied square by (col, row). Built once, then push and undo_last_move only update the
+            squares the move touched; make and unmake (the search) drop it instead.
+        """
+        if self._piece_map is None:
+            self._piece_map = {}
+            for sq in scan_forward(self.occupied):
+                pos = SQUARE_COORDS[sq]
+                self._piece_map[pos] = Piece(CODE_SYMBOLS[self.squares[sq]], pos)
+        return self._piece_map
+
+    def _update_piece_map(self, piece_map: dict, move: int) -> None:
+        """ Brings a piece map of the position before (or after) the move up to date with the squares."""
+        to_sq = move >> 6 & 63
+        touched = [move & 63, to_sq]
+        if move & MOVE_EN_PASSANT:
+            touched += [to_sq - 8, to_sq + 8]
+        elif move & MOVE_CASTLING:
+            touched += [to_sq - 2, to_sq - 1, to_sq + 1]
+        for sq in touched:
+            pos = SQUARE_COORDS[sq]
+            code = self.squares[sq]
+            if not code:
+                piece_map.pop(pos, None)
+            elif pos not in piece_map or piece_map[pos].piece_symbol != CODE_SYMBOLS[code]:
+                piece_map[pos] = Piece(CODE_SYMBOLS[code], pos)
+        self._piece_map = piece_map
+
+    @property
+    def grid(self) -> list:
+        """ 8x8 rows of Piece objects and '.', built once per position for the UI."""
+        if self._grid is None:
+            grid = [['.']*8 for j in range(8)]
+            for (c, r), piece in self.piece_map.items():
+                grid[r][c] = piece
+            self._grid = grid
+        return self._grid
+
+    @property
+    def move_log(self) -> list:
+        return [Move.from_packed(entry[0]) for entry in self.undo_log]
+
+    @property
+    def last_move(self) -> Move:
+        return Move.from_packed(self.undo_log[-1][0]) if self.undo_log else None
+
+    def fen_is_valid(self, fen) -> bool:
+        """ Checks a FEN given as a string or, as before, as the list of its fields (fen.split())."""
+        if isinstance(fen, (list, tuple)):
+            fen = " ".join(fen)
+        elif not isinstance(fen, str):
+            raise TypeError(f"fen_is_valid takes a FEN string or its list of fields, not {type(fen).__name__}")
+        try:
+            parse_fen(fen)
+        except Exception:
             return False
         return True
 
     def get_fen(self):
-        fen = ""
-        for row in self.grid:
-            for spot in row:
-                fen += str(spot)
-            fen += '/'
-        for i in range(8, 0, -1):
-            fen = fen.replace("."*i, str(i))
-        fen = fen[:-1] + ' '
-        if self.white_to_move:
-            fen += 'w'
-        else:
-            fen += 'b'
-        fen += ' '
-        cs = ''
-        if self.rights_to_castle_king_side['white']:
-            cs += 'K'
-        if self.rights_to_castle_queen_side['white']:
-            cs += 'Q'
-        if self.rights_to_castle_king_side['black']:
-            cs += 'k'
-        if self.rights_to_castle_queen_side['black']:
-            cs += 'q'
-        fen += cs if cs != '' else '-'
-        fen += ' '
-        fen += coord_to_str(*self.en_passant_target) if self.en_passant_target else '-'
-        fen += ' '
-        fen += str(self.half_moves) + ' '
-        fen += str(self.full_moves)
-        
-        return fen
+        ep = coord_to_str(*self.en_passant_target) if self.en_passant_target else '-'
+        return f"{board_fen(self.squares)} {'w' if self.white_to_move else 'b'} {CASTLING_STRINGS[self.castling_rights]} " \
+               f"{ep} {self.half_moves} {self.full_moves}"
+
+    def _put(self, sq: int, code: int) -> None:
+        """ Puts a piece on an empty square, keeping the bitboards and the hash in sync."""
+        bit = BB_SQUARES[sq]
+        self.squares[sq] = code
+        self.pieces[code] |= bit
+        self.occupied_co[not code & BLACK] |= bit
+        self.occupied |= bit
+        self.zobrist ^= _ZOBRIST_CODES[code][sq]
+
+    def _remove(self, sq: int) -> int:
+        """ Takes the piece off the square and returns its code."""
+        bit = BB_SQUARES[sq]
+        code = self.squares[sq]
+        self.squares[sq] = EMPTY
+        self.pieces[code] ^= bit
+        self.occupied_co[not code & BLACK] ^= bit
+        self.occupied ^= bit
+        self.zobrist ^= _ZOBRIST_CODES[code][sq]
+        return code
+
+    def set_piece(self, col: int, row: int, piece) -> None:
+        """ Puts a piece (or '.') on the square, keeping the bitboards in sync."""
+        sq = square(col, row)
+        if self.squares[sq]:
+            self._remove(sq)
+        if piece != '.':
+            self._put(sq, SYMBOL_CODES[str(piece)])
+        self._legal_moves = None
+        self._clear_views()
+
+    def _en_passant_key(self) -> int:
+        """ The en passant file is hashed only if a pawn of the side to move can capture there."""
+        if not self.en_passant_target:
+            return 0
+        turn = self.white_to_move
+        if PAWN_ATTACKS[not turn][square(*self.en_passant_target)] & self.pieces[PAWN if turn else PAWN | BLACK]:
+            return ZOBRIST_EN_PASSANT[self.en_passant_target[0]]
+        return 0
 
     def square_is_empty(self, c, r):
-        return self.grid[r][c] == '.'
+        return not self.occupied & BB_SQUARES[square(c, r)]
 
     def square_is_attacked(self, c, r, color):
         """
-            Checks if the empty square is attacked by piece of this color
+            Checks if the square is attacked by piece of this color
             if the piece is pinned it doesn't mean it can attack a square
         """
-        return (c, r) in map(lambda x: x.to_square, self.gen_plegal_moves(color, except_pieces=('k',)))
+        return self.is_attacked(square(c, r), color)
+
+    def attackers_of(self, sq: int, color: bool, occupied: int = None) -> int:
+        """
+            Bitboard of pieces of this color attacking the square. Looks outward from the square with every
+            piece pattern, sliders are blocked by occupied (the current occupancy by default).
+        """
+        if occupied is None:
+            occupied = self.occupied
+        side = 0 if color else BLACK
+        pieces = self.pieces
+        queens = pieces[QUEEN | side]
+        return (PAWN_ATTACKS[not color][sq] & pieces[PAWN | side]) | (KNIGHT_ATTACKS[sq] & pieces[KNIGHT | side]) \
+            | (KING_ATTACKS[sq] & pieces[KING | side]) | (bishop_attacks(sq, occupied) & (pieces[BISHOP | side] | queens)) \
+            | (rook_attacks(sq, occupied) & (pieces[ROOK | side] | queens))
+
+    def is_attacked(self, sq: int, color: bool) -> bool:
+        return bool(self.attackers_of(sq, color))
 
     def get_king(self, turn: bool) -> Piece:
-            for row in self.grid:
-                for spot in row:
-                    if spot == '.': continue
-                    if spot.piece_symbol.lower() == 'k' and ((spot.color == "white") == turn):
-                        return spot
+        c, r = SQUARE_COORDS[lsb(self.pieces[KING if turn else KING | BLACK])]
+        return self.grid[r][c]
 
     def is_mate(self) -> bool:
         """ Checks if the side to move is in mate."""
-        return self.is_check() and len(self.legal_moves) == 0
+        return self.is_check() and len(self.packed_legal_moves) == 0
 
     def is_stalemate(self) -> bool:
         """ Checks if it's a stalemate"""
-        return not self.is_check() and len(self.legal_moves) == 0
+        return not self.is_check() and len(self.packed_legal_moves) == 0
 
     def is_check(self) -> bool:
         """ Checks if the side to move is in check. """
-        king = self.get_king(self.white_to_move)
-        for move in self.gen_plegal_moves(not self.white_to_move, except_pieces=('k', )):
-        # for move in self.plegal_moves[self.white_to_move]:
-            if not move.capturing: continue
-            if king.pos == move.to_square:
-                return True
-        return False
+        turn = self.white_to_move
+        return self.is_attacked(lsb(self.pieces[KING if turn else KING | BLACK]), not turn)
+
+    def is_fifty_moves(self) -> bool:
+        """ Checks if fifty moves of each side were played without a capture or a pawn move."""
+        return self.half_moves >= 100
+
+    def repetitions(self) -> int:
+        """
+            How many times the position occurred before. Only the keys since the last capture or pawn move can
+            match, and of those every second one, where the same side was to move.
+        """
+        history = self.zobrist_history
+        key = self.zobrist
+        count = 0
+        for i in range(len(history) - 2, max(len(history) - self.half_moves, 0) - 1, -2):
+            if history[i] == key:
+                count += 1
+        return count
+
+    def is_repetition(self, count: int = 3) -> bool:
+        return self.repetitions() + 1 >= count
+
+    def is_insufficient_material(self) -> bool:
+        """ Checks if neither side can mate: kings with one knight at most, or with bishops all on one colour."""
+        pieces = self.pieces
+        if pieces[PAWN] | pieces[PAWN | BLACK] | pieces[ROOK] | pieces[ROOK | BLACK] | pieces[QUEEN] \
+        | pieces[QUEEN | BLACK]:
+            return False
+        knights = pieces[KNIGHT] | pieces[KNIGHT | BLACK]
+        bishops = pieces[BISHOP] | pieces[BISHOP | BLACK]
+        if not bishops:
+            return not knights & (knights - 1)
+        return not knights and (not bishops & BB_LIGHT_SQUARES or not bishops & BB_DARK_SQUARES)
+
+    def draw_reason(self) -> str:
+        """ The rule the game is drawn by in this position, None if it is not a draw."""
+        if self.is_stalemate():
+            return "stalemate"
+        if self.is_insufficient_material():
+            return "insufficient material"
+        if self.is_fifty_moves() and not self.is_mate():
+            return "fifty moves"
+        if self.is_repetition():
+            return "threefold repetition"
+        return None
+
+    def _pinned(self, turn: bool, king_sq: int) -> int:
+        """ Bitboard of pieces of this color pinned to their king."""
+        enemy = BLACK if turn else 0
+        queens = self.pieces[QUEEN | enemy]
+        snipers = (bishop_attacks(king_sq, BB_EMPTY) & (self.pieces[BISHOP | enemy] | queens)) \
+            | (rook_attacks(king_sq, BB_EMPTY) & (self.pieces[ROOK | enemy] | queens))
+        pinned = BB_EMPTY
+        for sniper in scan_forward(snipers):
+            blockers = BETWEEN[king_sq][sniper] & self.occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        return pinned & self.occupied_co[turn]
 
     def gen_legal_moves(self):
-        self.plegal_moves[self.white_to_move] = list(self.gen_plegal_moves(self.white_to_move))
-        self.plegal_moves[not self.white_to_move] = list(self.gen_plegal_moves(not self.white_to_move))
+        """
+            Legal moves (packed) from pins and checkers found once from the king square: a pinned piece moves
+            only along its pin line and in check only captures of the checker or blocks on its ray are kept.
+            King moves and en passant get a real attack test.
+        """
+        turn = self.white_to_move
+        king_bb = self.pieces[KING if turn else KING | BLACK]
+        king_sq = lsb(king_bb)
+        occupied = self.occupied
+        checkers = self.attackers_of(king_sq, not turn, occupied)
+
         moves = []
-        for move in self.plegal_moves[self.white_to_move]:
-            self.replace(move.from_square, move.to_square)
-            if not self.is_check():
+        for move in self.gen_plegal_king_moves(turn):
+            if move & MOVE_CASTLING:
+                moves.append(move)
+            elif not self.attackers_of(move >> 6 & 63, not turn, occupied ^ king_bb):
                 moves.append(move)
-            self.replace(move.to_square, move.from_square)
-            if move.capturing:
-                c, r = move.capturing.pos
-                self.grid[r][c] = move.capturing
+        if checkers & (checkers - 1):
+            return moves # double check, only the king can move
+
+        targets = BB_SQUARES[lsb(checkers)] | BETWEEN[king_sq][lsb(checkers)] if checkers else BB_ALL
+        pinned = self._pinned(turn, king_sq)
+        plegal = []
+        for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN):
+            plegal += self.gen_plegal_movesFunctions[piece_type](turn, ~pinned, targets)
+        for sq in scan_forward(pinned):
+            piece_type = self.squares[sq] & 7
+            plegal += self.gen_plegal_movesFunctions[piece_type](turn, BB_SQUARES[sq], targets & LINE[king_sq][sq])
+
+        for move in plegal:
+            if move & MOVE_EN_PASSANT and not self._en_passant_is_legal(move, king_sq):
+                continue
+            moves.append(move)
         return moves
 
+    def _en_passant_is_legal(self, move: int, king_sq: int) -> bool:
+        """ En passant removes two pieces from a line at once, so it is tested on the occupancy after the capture."""
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        captured = BB_SQUARES[(from_sq & ~7) | (to_sq & 7)]
+        occupied = self.occupied ^ BB_SQUARES[from_sq] ^ captured | BB_SQUARES[to_sq]
+        return not self.attackers_of(king_sq, not self.white_to_move, occupied) & ~captured
+
     def gen_plegal_moves(self, turn, except_pieces = (None,)):
         moves = []
-        for row in self.grid:
-            for p in row:
-                if p == '.': continue
-                if p.isWhite !=turn: continue
-                if p.piece_symbol.lower() in except_pieces: continue
-                for m in self.gen_plegal_movesFunctions[str(p).lower()](p):
-                    moves.append(m)
+        for piece_type, gen_plegal in self.gen_plegal_movesFunctions.items():
+            if piece_type in except_pieces: continue
+            moves += gen_plegal(turn)
         return moves
-    
-    def gen_plegal_pawn_moves(self, pawn: Piece):
-        pmoves = []
-        c, r = pawn.pos
-        dy = -1
-        if not pawn.isWhite:
-            dy = 1
-        if r + dy >= 8 or r + dy < 0: return pmoves
-        if self.grid[r + dy][c] == '.':
-            # if white pawn is at 7th rank or black pawn is at 2nd rank
-            if pawn.isWhite and r == 1 or not pawn.isWhite and r == 6:
-                for promotion_type in ('q', 'r', 'n', 'b'):
-                    pmoves.append(Move((c, r), (c, r + dy), promotion=promotion_type))
+
+    def _append_moves(self, moves: list, from_sq: int, targets: int) -> None:
+        """ Appends a move from from_sq to every square of the targets bitboard."""
+        captures = targets & self.occupied
+        squares = self.squares
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            to_sq = bit.bit_length() - 1
+            if bit & captures:
+                moves.append(from_sq | to_sq << 6 | MOVE_CAPTURE | squares[to_sq] << 18)
             else:
-                pmoves.append(Move((c, r), (c, r + dy)))
-            if 0 <= r + 2*dy <= 7:
-                if (pawn.pos[1] in (1, 6)) and self.grid[r + 2*dy][c] == '.':
-                    pmoves.append(Move((c, r), (c, r + dy*2)))
-        for dx in (-1, 1):
-            if not (0 <= r + dy <= 7 and 0 <= c + dx <= 7): continue
-            if self.grid[r + dy][c + dx] != '.':
-                if self.grid[r + dy][c + dx].isWhite != pawn.isWhite:
-                    pmoves.append(Move((c, r), (c + dx, r + dy),capturing=self.grid[r + dy][c + dx]))
-            if (c + dx, r + dy) == self.en_passant_target:
-                pmoves.append(Move((c, r), (c + dx, r + dy), en_passant_target=self.en_passant_target))
+                moves.append(from_sq | to_sq << 6)
+
+    def _append_pawn_moves(self, moves: list, targets: int, step: int, last_rank: int, captures: bool) -> None:
+        """ Appends pawn moves to every square of the targets bitboard, the pawn stands step squares behind."""
+        squares = self.squares
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            to_sq = bit.bit_length() - 1
+            move = (to_sq + step) | to_sq << 6
+            if captures:
+                move |= MOVE_CAPTURE | squares[to_sq] << 18
+            if bit & last_rank:
+                for promotion in _PROMOTION_SHIFTS:
+                    moves.append(move | promotion)
+            else:
+                moves.append(move)
+
+    def gen_plegal_pawn_moves(self, turn: bool, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
+        """ En passant ignores to_mask, the caller has to test it on its own."""
+        pmoves = []
+        pawns = self.pieces[PAWN if turn else PAWN | BLACK] & from_mask
+        empty = ~self.occupied & BB_ALL
+        enemies = self.occupied_co[not turn] & to_mask
+        # pawn sets are shifted all at once: white pawns move towards row 0, black ones towards row 7
+        if turn:
+            single = (pawns >> 8) & empty
+            double = ((single & BB_RANK_3) >> 8) & empty
+            left = ((pawns & ~BB_FILE_A) >> 9) & enemies
+            right = ((pawns & ~BB_FILE_H) >> 7) & enemies
+            step, left_step, right_step, last_rank = 8, 9, 7, BB_RANK_8
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & BB_RANK_6) << 8) & empty
+            left = ((pawns & ~BB_FILE_A) << 7) & enemies
+            right = ((pawns & ~BB_FILE_H) << 9) & enemies
+            step, left_step, right_step, last_rank = -8, -7, -9, BB_RANK_1
+        single, double = single & to_mask, double & to_mask
+
+        self._append_pawn_moves(pmoves, single, step, last_rank, False)
+        self._append_pawn_moves(pmoves, double, 2*step, last_rank, False)
+        self._append_pawn_moves(pmoves, left, left_step, last_rank, True)
+        self._append_pawn_moves(pmoves, right, right_step, last_rank, True)
+
+        if self.en_passant_target:
+            # a pawn attacks the target square if an opposite pawn on the target would attack the pawn
+            ep_sq = square(*self.en_passant_target)
+            flags = ep_sq << 6 | MOVE_EN_PASSANT | MOVE_CAPTURE | (PAWN if not turn else PAWN | BLACK) << 18
+            for from_sq in scan_forward(PAWN_ATTACKS[not turn][ep_sq] & pawns):
+                pmoves.append(from_sq | flags)
 
         return pmoves
 
-    def gen_plegal_bishop_moves(self, bishop: Piece):
+    def gen_plegal_bishop_moves(self, turn: bool, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
         pmoves = []
-        directions = ((1, 1), (-1, -1), (1, -1), (-1, 1))
-        c, r = bishop.pos
-        for dx, dy in directions:
-            i = 1
-            while 0 <= c + dx*i <= 7 and 0 <= r + dy*i <= 7:
-                spot = self.grid[r + dy*i][c + dx*i]
-                if spot == '.':
-                    pmoves.append(Move((c, r), (c + dx*i, r + dy*i)))
-                else:
-                    if spot.isWhite != bishop.isWhite:
-                        pmoves.append(Move((c, r), (c + dx*i, r + dy*i), capturing=spot))
-                    break
-                i += 1
+        targets = ~self.occupied_co[turn] & to_mask
+        for sq in scan_forward(self.pieces[BISHOP if turn else BISHOP | BLACK] & from_mask):
+            self._append_moves(pmoves, sq, bishop_attacks(sq, self.occupied) & targets)
         return pmoves
 
-    def gen_plegal_knight_moves(self, knight: Piece):
+    def gen_plegal_knight_moves(self, turn: bool, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
         pmoves = []
-        c, r = knight.pos
-        for dy in (-2, -1, 1, 2):
-            for dx in (-2, -1, 1, 2):
-                if abs(dx) == abs(dy): continue
-                if not (0 <= c + dx <= 7 and 0 <= r + dy <= 7): continue
-                spot = self.grid[r + dy][c + dx]
-                if spot == '.':
-                    pmoves.append(Move((c,r), (c + dx, r + dy)))
-                else:
-                    if spot.isWhite != knight.isWhite:
-                        pmoves.append(Move((c, r), (c + dx, r + dy), capturing=spot))
+        targets = ~self.occupied_co[turn] & to_mask
+        for sq in scan_forward(self.pieces[KNIGHT if turn else KNIGHT | BLACK] & from_mask):
+            self._append_moves(pmoves, sq, KNIGHT_ATTACKS[sq] & targets)
         return pmoves
 
-    def gen_plegal_king_moves(self, king: Piece):
+    def gen_plegal_king_moves(self, turn: bool):
         pmoves = []
-        c, r = king.pos
-        directions = ((1, 1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1), (-1, 1), (1, -1))
-        for dx, dy in directions:
-            if not (0 <= c + dx <= 7 and 0 <= r + dy <= 7): continue
-            spot = self.grid[r + dy][c + dx]
-            if spot == '.':
-                pmoves.append(Move((c,r), (c + dx, r + dy)))
-            else:
-                if spot.isWhite != king.isWhite:
-                    pmoves.append(Move((c, r), (c + dx, r + dy), capturing=spot))
-
-        opposite_king = self.get_king(not king.isWhite)
-        for i in range(len(pmoves) - 1, -1, -1):
-            mc, mr = pmoves[i].to_square
-            kc, kr = opposite_king.pos
-            if abs(kc - mc) <= 1 and abs(kr - mr) <= 1:
-                pmoves.pop(i)
+        king_sq = lsb(self.pieces[KING if turn else KING | BLACK])
+        opposite_king_sq = lsb(self.pieces[KING | BLACK if turn else KING])
+        self._append_moves(pmoves, king_sq, KING_ATTACKS[king_sq] & ~self.occupied_co[turn] & ~KING_ATTACKS[opposite_king_sq])
 
         # generating castle-moves
-        if self.rights_to_castle_king_side[king.color] and not self.is_check(): # for castling to king side
-            if all([self.square_is_empty(c + i, r) for i in (1, 2)]) \
-            and all([not self.square_is_attacked(c + i, r, not king.isWhite) for i in (1, 2)]):
-                pmoves.append(Move((c, r), (c + 2, r), castling='k'))
-        if self.rights_to_castle_queen_side[king.color] and not self.is_check(): # for castling to queen side
-            if all([self.square_is_empty(c - i, r) for i in (1,2,3)]) \
-            and all([not self.square_is_attacked(c - i, r, not king.isWhite) for i in (1, 2)]):
-                pmoves.append(Move((c, r), (c - 2, r), castling='q'))
+        r = king_sq >> 3
+        king_side, queen_side = (WHITE_KING_SIDE, WHITE_QUEEN_SIDE) if turn else (BLACK_KING_SIDE, BLACK_QUEEN_SIDE)
+        rooks = self.pieces[ROOK if turn else ROOK | BLACK]
+        if self.castling_rights & king_side and rooks & BB_SQUARES[square(7, r)]: # for castling to king side
+            if not self.occupied & (BB_SQUARES[king_sq + 1] | BB_SQUARES[king_sq + 2]) \
+            and not any(self.is_attacked(king_sq + i, not turn) for i in (0, 1, 2)):
+                pmoves.append(king_sq | (king_sq + 2) << 6 | MOVE_CASTLING)
+        if self.castling_rights & queen_side and rooks & BB_SQUARES[square(0, r)]: # for castling to queen side
+            if not self.occupied & (BB_SQUARES[king_sq - 1] | BB_SQUARES[king_sq - 2] | BB_SQUARES[king_sq - 3]) \
+            and not any(self.is_attacked(king_sq - i, not turn) for i in (0, 1, 2)):
+                pmoves.append(king_sq | (king_sq - 2) << 6 | MOVE_CASTLING)
 
         return pmoves
 
-    def gen_plegal_rook_moves(self, rook: Piece):
+    def gen_plegal_rook_moves(self, turn: bool, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
         pmoves = []
-        directions = ((1, 0), (-1, 0), (0, -1), (0, 1))
-        c, r = rook.pos
-        for dx, dy in directions:
-            i = 1
-            while 0 <= c + dx*i <= 7 and 0 <= r + dy*i <= 7:
-                spot = self.grid[r + dy*i][c + dx*i]
-                if spot == '.':
-                    pmoves.append(Move((c, r), (c + dx*i, r + dy*i)))
-                else:
-                    if spot.isWhite != rook.isWhite:
-                        pmoves.append(Move((c, r), (c + dx*i, r + dy*i), capturing=spot))
-                    break
-                i += 1
+        targets = ~self.occupied_co[turn] & to_mask
+        for sq in scan_forward(self.pieces[ROOK if turn else ROOK | BLACK] & from_mask):
+            self._append_moves(pmoves, sq, rook_attacks(sq, self.occupied) & targets)
         return pmoves
 
-    def gen_plegal_queen_moves(self, queen: Piece):
-        pmoves = self.gen_plegal_bishop_moves(queen) + self.gen_plegal_rook_moves(queen)
+    def gen_plegal_queen_moves(self, turn: bool, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
+        pmoves = []
+        targets = ~self.occupied_co[turn] & to_mask
+        for sq in scan_forward(self.pieces[QUEEN if turn else QUEEN | BLACK] & from_mask):
+            self._append_moves(pmoves, sq, (bishop_attacks(sq, self.occupied) | rook_attacks(sq, self.occupied)) & targets)
         return pmoves
 
     def get_move_from_uci(self, uci) -> Move:
+        """ The legal move for the uci string, a bare Move (rejected by push) if it is not legal here."""
+        packed = self.legal_index.get(uci_key(uci))
+        if packed is not None:
+            return Move.from_packed(packed)
         from_s = str_to_coord(uci[:2].lower())
         to_s = str_to_coord(uci[2:4].lower())
         p = None if len(uci) <= 4 else uci[4]
-        return Move(from_s, to_s, p, self.grid[to_s[1]][to_s[0]] != '.')
+        return Move(from_s, to_s, p)
+
+    def make_uci(self, moves: list) -> None:
+        """ Plays uci moves with make, raising on the first one that is not legal."""
+        for uci in moves:
+            packed = self.legal_index.get(uci_key(uci))
+            if packed is None:
+                raise Exception(f"Invalid move {uci}")
+            self.make(packed)
+
+    def encode(self, move: Move) -> int:
+        """ Packs a move in the current position; flags and the captured piece are read from the board."""
+        if move.packed is not None:
+            return move.packed
+        from_sq, to_sq = square(*move.from_square), square(*move.to_square)
+        code = self.squares[from_sq]
+        packed = from_sq | to_sq << 6
+        if move.promotion:
+            packed |= PROMOTION_TYPES[move.promotion.lower()] << 12
+        if self.squares[to_sq]:
+            packed |= MOVE_CAPTURE | self.squares[to_sq] << 18
+        elif code & 7 == PAWN and (from_sq ^ to_sq) & 7:
+            packed |= MOVE_CAPTURE | MOVE_EN_PASSANT | (code ^ BLACK) << 18
+        elif code & 7 == KING and abs(to_sq - from_sq) == 2:
+            packed |= MOVE_CASTLING
+        return packed
+
+    def san(self, move: Move) -> str:
+        """ Standard algebraic notation of a legal move in the current position, e.g. Nbd7, exd6, O-O, e8=Q+."""
+        packed = self.encode(move)
+        from_sq, to_sq = packed & 63, packed >> 6 & 63
+        fcol, frow = SQUARE_COORDS[from_sq]
+        tcol, trow = SQUARE_COORDS[to_sq]
+        code = self.squares[from_sq]
+        piece_type = CODE_SYMBOLS[code & 7]
+        if packed & MOVE_CASTLING:
+            san = 'O-O' if tcol == 6 else 'O-O-O'
+        else:
+            is_capture = packed & MOVE_CAPTURE
+            if piece_type == 'P':
+                san = FILE_NAMES[fcol] + 'x' if is_capture else ''
+            else:
+                san = piece_type
+                # other pieces of the same type that can go to the same square
+                others = [SQUARE_COORDS[m & 63] for m in self.packed_legal_moves
+                          if m >> 6 & 63 == to_sq and m & 63 != from_sq and self.squares[m & 63] == code]
+                if others:
+                    if all(c != fcol for c, r in others):
+                        san += FILE_NAMES[fcol]
+                    elif all(r != frow for c, r in others):
+                        san += RANK_NAMES[7 - frow]
+                    else:
+                        san += coord_to_str(fcol, frow)
+                if is_capture:
+                    san += 'x'
+            san += coord_to_str(tcol, trow)
+            if packed >> 12 & 7:
+                san += '=' + CODE_SYMBOLS[packed >> 12 & 7]
+        self.make(packed)
+        if self.is_check():
+            san += '#' if not self.packed_legal_moves else '+'
+        self.unmake()
+        return san
+
+    def parse_san(self, san: str) -> Move:
+        """ The legal move written in standard algebraic notation; check marks and annotations are ignored."""
+        text = san.rstrip('+#!?')
+        legal = self.packed_legal_moves
+        if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+            king_sq = lsb(self.pieces[KING if self.white_to_move else KING | BLACK])
+            to_sq = king_sq + 2 if len(text) == 3 else king_sq - 2
+            candidates = [m for m in legal if m & MOVE_CASTLING and m >> 6 & 63 == to_sq]
+        else:
+            promotion = 0
+            if '=' in text:
+                text, symbol = text.split('=', 1)
+                promotion = PROMOTION_TYPES.get(symbol.lower(), 7)
+            elif len(text) > 2 and text[-1] in 'NBRQ' and text[-2].isdigit():
+                text, promotion = text[:-1], PROMOTION_TYPES[text[-1].lower()]
+            piece_type = PAWN
+            if text[:1] in ('N', 'B', 'R', 'Q', 'K'):
+                piece_type = SYMBOL_CODES[text[0]]
+                text = text[1:]
+            to_sq = SQUARE_NUMBERS.get(text[-2:])
+            # file, rank or both of the from-square
+            hint = text[:-2].replace('x', '')
+            candidates = [m for m in legal if m >> 6 & 63 == to_sq and self.squares[m & 63] & 7 == piece_type
+                          and m >> 12 & 7 == promotion and all(c in coord_to_str(*SQUARE_COORDS[m & 63]) for c in hint)]
+        if len(candidates) != 1:
+            raise Exception(f"{'Ambiguous' if candidates else 'Invalid'} move {san}")
+        return Move.from_packed(candidates[0])
 
     def push(self, move: Move):
-        self.en_passant_target = None
-        if move.uci() not in map(lambda x: x.uci(), self.legal_moves):
+        packed = self.legal_index.get(move_key(move))
+        if packed is None:
             raise Exception(f"Invalid move {move.uci()}")
-        self.castling_rights_log.append([self.rights_to_castle_king_side.copy(), self.rights_to_castle_queen_side.copy()])
-        self.move_log.append(move)
-        fcol, frow = move.from_square
-        tcol, trow = move.to_square
-        if move.en_passant_target:
-            self.grid[frow][tcol] = '.'
-        self.replace(move.from_square, move.to_square)
-        self.half_moves += 1
-        if not self.grid[trow][tcol].isWhite:
-            self.full_moves += 1
-        self.white_to_move = not self.white_to_move
-
-        # if move is promotion
-        if move.promotion:
-            symbol = move.promotion if not self.grid[trow][tcol].isWhite else move.promotion.upper()
-            self.grid[trow][tcol] = Piece(symbol, pos=move.to_square)
-
-        # if move is castle-move
-        if move.castling == 'q':
-            self.replace((0, trow), (3, trow))
-            self.grid[trow][3].pos = (3, trow)
-        elif move.castling == 'k':
-            self.replace((7, trow), (5, trow))
-            self.grid[trow][5].pos = (5, trow)
-        color = self.grid[trow][tcol].color
-        if self.grid[trow][tcol].piece_symbol in ('K', 'k'):
-            self.rights_to_castle_king_side[color] = False
-            self.rights_to_castle_queen_side[color] = False
-        if self.grid[trow][tcol].piece_symbol in ('R', 'r'):
-            if fcol == 7:
-                self.rights_to_castle_king_side[color] = False
-            elif fcol == 0:
-                self.rights_to_castle_queen_side[color] = False
-
-        if abs(trow - frow) == 2:
-            if self.grid[trow][tcol].piece_symbol == 'P':
-                self.en_passant_target = (tcol, trow + 1)
-            if self.grid[trow][tcol].piece_symbol == 'p':
-                self.en_passant_target = (tcol, trow - 1)
-        
-        self.legal_moves = self.gen_legal_moves()
-        
+        piece_map = self._piece_map
+        self.make(packed)
+        if piece_map is not None:
+            self._update_piece_map(piece_map, packed)
 
     def undo_last_move(self):
-        if self.move_log == []:
+        if self.undo_log == []:
             return
+        piece_map = self._piece_map
+        packed = self.undo_log[-1][0]
+        self.unmake()
+        if piece_map is not None:
+            self._update_piece_map(piece_map, packed)
+
+    def make(self, move) -> None:
+        """
+            Plays the move (packed or a Move) without validating it. Castling and en passant of a Move are
+            recognised from the board, so a bare from/to/promotion move works too.
+        """
+        if not isinstance(move, int):
+            move = self.encode(move)
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        turn = self.white_to_move
+        self.undo_log.append((move, self.castling_rights, self.en_passant_target, self.half_moves, self.full_moves))
+        self.zobrist_history.append(self.zobrist)
+        self.zobrist ^= ZOBRIST_CASTLING[self.castling_rights] ^ self._en_passant_key() ^ ZOBRIST_BLACK_TO_MOVE
+
+        if move & MOVE_EN_PASSANT:
+            self._remove(to_sq + 8 if turn else to_sq - 8)
+        elif move & MOVE_CAPTURE:
+            self._remove(to_sq)
+        code = self._remove(from_sq)
+        promotion = move >> 12 & 7
+        self._put(to_sq, promotion | (code & BLACK) if promotion else code)
         self.en_passant_target = None
-        move = self.move_log.pop()
-        self.rights_to_castle_king_side, self.rights_to_castle_queen_side = self.castling_rights_log.pop()
-        if move.en_passant_target:
-            self.en_passant_target = move.en_passant_target
-            symbol = 'P' if self.white_to_move else 'p'
-            self.grid[move.from_square[1]][move.to_square[0]] = Piece(symbol, (move.to_square[0], move.from_square[1]))
-        fcol, frow = move.to_square
-        tcol, trow = move.from_square
-        self.grid[trow][tcol] = self.grid[frow][fcol]
-        self.grid[trow][tcol].pos = (tcol, trow)
-        self.grid[frow][fcol] = '.' if not move.capturing else move.capturing
-        self.half_moves -= 1
-        if self.white_to_move:
-            self.full_moves -= 1
+        if code & 7 == PAWN and abs(to_sq - from_sq) == 16:
+            self.en_passant_target = SQUARE_COORDS[(from_sq + to_sq) >> 1]
+        elif move & MOVE_CASTLING:
+            # rook jumps over the king
+            if to_sq & 7 == 6:
+                self._put(to_sq - 1, self._remove(to_sq + 1))
+            else:
+                self._put(to_sq + 1, self._remove(to_sq - 2))
+        self.castling_rights &= CASTLING_KEEP[from_sq] & CASTLING_KEEP[to_sq]
+
+        # the clock of the fifty move rule starts again on every capture and pawn move
+        if move & MOVE_CAPTURE or code & 7 == PAWN:
+            self.half_moves = 0
+        else:
+            self.half_moves += 1
+        if not turn:
+            self.full_moves += 1
+        self.white_to_move = not turn
+        self.zobrist ^= ZOBRIST_CASTLING[self.castling_rights] ^ self._en_passant_key()
+        self._legal_moves = None
+        self._clear_views()
+
+    def unmake(self) -> None:
+        """ Takes back the last move made with make or push, restoring the state from the undo log."""
+        move, self.castling_rights, self.en_passant_target, self.half_moves, self.full_moves = self.undo_log.pop()
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        code = self._remove(to_sq)
+        self._put(from_sq, PAWN | (code & BLACK) if move >> 12 & 7 else code)
+        if move & MOVE_EN_PASSANT:
+            self._put(to_sq - 8 if code & BLACK else to_sq + 8, move >> 18 & 15)
+        elif move & MOVE_CAPTURE:
+            self._put(to_sq, move >> 18 & 15)
+        elif move & MOVE_CASTLING:
+            if to_sq & 7 == 6:
+                self._put(to_sq + 1, self._remove(to_sq - 1))
+            else:
+                self._put(to_sq - 2, self._remove(to_sq + 1))
         self.white_to_move = not self.white_to_move
-        
-        if move.promotion:
-            symbol = 'P' if self.grid[trow][tcol].isWhite else 'p'
-            self.grid[trow][tcol] = Piece(symbol, move.from_square)
-        
-        # if move is castle-move
-        if move.castling == 'q':
-            self.grid[trow][3].pos = (0, trow)
-            self.replace((3, trow), (0, trow))
-        elif move.castling == 'k':
-            self.grid[trow][5].pos = (7, trow)
-            self.replace((5, trow), (7, trow))
-
-        self.legal_moves = self.gen_legal_moves()
-    
+        self.zobrist = self.zobrist_history.pop()
+        self._legal_moves = None
+        self._clear_views()
+
+    def perft(self, depth: int) -> int:
+        """ Counts the leaf nodes of the legal move tree, the reference test for the move generator."""
+        if depth == 0:
+            return 1
+        if depth == 1:
+            return len(self.packed_legal_moves)
+        nodes = 0
+        for move in self.packed_legal_moves:
+            self.make(move)
+            nodes += self.perft(depth - 1)
+            self.unmake()
+        return nodes
+
+    def divide(self, depth: int) -> dict:
+        """ perft split by the first move: {uci: leaf nodes}."""
+        result = {}
+        for move in self.packed_legal_moves:
+            self.make(move)
+            result[Move.from_packed(move).uci()] = self.perft(depth - 1)
+            self.unmake()
+        return result
+
     def replace(self, from_square, to_square):
-        fcol, frow = from_square
-        tcol, trow = to_square
-        self.grid[trow][tcol] = '.'
-        self.grid[trow][tcol], self.grid[frow][fcol] = self.grid[frow][fcol], self.grid[trow][tcol]
-        self.grid[trow][tcol].pos = to_square
+        from_sq = square(*from_square)
+        if self.squares[from_sq]:
+            self.set_piece(*to_square, CODE_SYMBOLS[self.squares[from_sq]])
+            self.set_piece(*from_square, '.')
 
     def print_castling_info(self):
         for king in (self.get_king(True), self.get_king(False)):
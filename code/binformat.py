@@ -0,0 +1,239 @@
+"""
+    Compact binary positions and games.
+
+    Position record, 32 bytes little-endian: occupancy bitboard (8), piece codes of the occupied squares in
+    square order as nibbles (16) and a state word (8): white to move bit 0, castling rights 1-4, en passant
+    file + 1 in 5-8 (0 for none), half moves 9-24, full moves 25-40.
+
+    Position file: 16 byte header (magic, version, record size, reserved) followed by records, so every record
+    starts 8-byte aligned.
+    Game file: 16 byte header, then per game a position record for the start, result (2), reserved (2),
+    ply count (4) and the move keys (2 bytes each, Chess.MOVE_KEY_MASK bits of the packed move); an index of
+    game offsets (8 bytes each, zero padded to start 8-byte aligned) and a footer with the index offset and the
+    game count close the file.
+    Both are read through mmap, records and move lists are memoryviews into the map.
+"""
+import mmap
+import struct
+import sys
+from array import array
+from Chess import Board, Move, RESULTS, RESULT_CODES, RESULT_UNFINISHED, move_key
+from bitboard import scan_forward, square
+
+
+POSITION_MAGIC = b"CHSP"
+GAME_MAGIC = b"CHSG"
+VERSION = 2
+RECORD_SIZE = 32
+
+_HEADER = struct.Struct("<4sIII")
+HEADER_SIZE = _HEADER.size
+_RECORD = struct.Struct("<Q16sQ")
+_GAME = struct.Struct("<HHI")
+_FOOTER = struct.Struct("<QQ")
+
+
+def pack_position(board: Board) -> bytes:
+    nibbles = 0
+    shift = 0
+    squares = board.squares
+    for sq in scan_forward(board.occupied):
+        nibbles |= squares[sq] << shift
+        shift += 4
+    ep = board.en_passant_target[0] + 1 if board.en_passant_target else 0
+    state = board.white_to_move | board.castling_rights << 1 | ep << 5 | min(board.half_moves, 0xFFFF) << 9 \
+        | min(board.full_moves, 0xFFFF) << 25
+    return _RECORD.pack(board.occupied, nibbles.to_bytes(16, "little"), state)
+
+
+def unpack_position(buffer, offset: int = 0) -> tuple:
+    """ (squares, white to move, castling rights, en passant square, half moves, full moves) of a record."""
+    occupied, pieces, state = _RECORD.unpack_from(buffer, offset)
+    nibbles = int.from_bytes(pieces, "little")
+    squares = [0] * 64
+    for sq in scan_forward(occupied):
+        squares[sq] = nibbles & 15
+        nibbles >>= 4
+    white_to_move = bool(state & 1)
+    ep_file = state >> 5 & 15
+    ep_square = square(ep_file - 1, 2 if white_to_move else 5) if ep_file else None
+    return squares, white_to_move, state >> 1 & 15, ep_square, state >> 9 & 0xFFFF, state >> 25 & 0xFFFF
+
+
+def board_from_record(buffer, offset: int = 0) -> Board:
+    board = Board(None)
+    board.set_squares(*unpack_position(buffer, offset))
+    return board
+
+
+def write_header(f, magic: bytes, version: int = VERSION, record_size: int = RECORD_SIZE) -> None:
+    """ The 16 byte header every file of this format and of position_index and book starts with."""
+    f.write(_HEADER.pack(magic, version, record_size, 0))
+
+
+def map_file(path: str, magic: bytes, version: int = VERSION, record_size: int = RECORD_SIZE) -> mmap.mmap:
+    """ Maps a file read-only after checking its header was written by write_header with the same values."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    found, found_version, found_size, _ = _HEADER.unpack_from(data, 0)
+    if found != magic or found_version != version or found_size != record_size:
+        data.close()
+        raise Exception(f"{path} is not a version {version} {magic.decode()} file")
+    return data
+
+
+def key_view(view: memoryview) -> memoryview:
+    """ The position keys of a mapped file of 16 byte entries that start with an 8 byte key, for bisect."""
+    return view[HEADER_SIZE:].cast('Q')[::2]
+
+
+class PositionWriter:
+    """ Appends position records to a file, creating it with a header if it does not exist."""
+    def __init__(self, path: str):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            write_header(self.file, POSITION_MAGIC)
+
+    def add(self, board: Board) -> None:
+        self.file.write(pack_position(board))
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PositionFile:
+    """ Random access to the records of a position file; nothing is read until a record is used."""
+    def __init__(self, path: str):
+        self.data = map_file(path, POSITION_MAGIC)
+        self.view = memoryview(self.data)
+
+    def __len__(self) -> int:
+        return (len(self.data) - HEADER_SIZE) // RECORD_SIZE
+
+    def __getitem__(self, index: int) -> memoryview:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        offset = HEADER_SIZE + index * RECORD_SIZE
+        return self.view[offset:offset + RECORD_SIZE]
+
+    def board(self, index: int) -> Board:
+        return board_from_record(self[index])
+
+    def close(self) -> None:
+        self.view.release()
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GameWriter:
+    """ Writes games one at a time; the index is written by close, so a game file is complete only after it."""
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        write_header(self.file, GAME_MAGIC)
+        self.offsets = array('Q')
+
+    def add(self, start: Board, moves, result: str = RESULT_UNFINISHED) -> None:
+        """ moves are packed moves or Moves played from the start position."""
+        keys = array('H', (move_key(move) for move in moves))
+        if sys.byteorder != "little":
+            keys.byteswap()
+        self.offsets.append(self.file.tell())
+        self.file.write(pack_position(start))
+        self.file.write(_GAME.pack(RESULT_CODES[result], 0, len(keys)))
+        self.file.write(keys.tobytes())
+
+    def close(self) -> None:
+        self.file.write(bytes(-self.file.tell() % 8))
+        index_offset = self.file.tell()
+        offsets = array('Q', self.offsets)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.write(_FOOTER.pack(index_offset, len(self.offsets)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PackedGame:
+    """ One game of a game file, its start record and move keys are views into the map."""
+    __slots__ = ('record', 'result', 'keys')
+
+    def __init__(self, record: memoryview, result: str, keys):
+        self.record = record
+        self.result = result
+        self.keys = keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def board(self) -> Board:
+        return board_from_record(self.record)
+
+    def replay(self):
+        """ Yields (board, packed move) before every move; the same Board is played forward in place."""
+        board = self.board()
+        for key in self.keys:
+            move = board.legal_index.get(key)
+            if move is None:
+                raise Exception(f"Invalid move key {key} at ply {len(board.undo_log) + 1}")
+            yield board, move
+            board.make(move)
+
+    def uci(self) -> list:
+        return [Move.from_packed(move).uci() for _, move in self.replay()]
+
+
+class GameFile:
+    def __init__(self, path: str):
+        self.data = map_file(path, GAME_MAGIC)
+        self.view = memoryview(self.data)
+        index_offset, count = _FOOTER.unpack_from(self.data, len(self.data) - _FOOTER.size)
+        self.offsets = self.view[index_offset:index_offset + 8 * count].cast('Q')
+        if sys.byteorder != "little":
+            self.offsets = array('Q', self.offsets)
+            self.offsets.byteswap()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> PackedGame:
+        offset = self.offsets[index]
+        result, _, plies = _GAME.unpack_from(self.data, offset + RECORD_SIZE)
+        moves_offset = offset + RECORD_SIZE + _GAME.size
+        keys = self.view[moves_offset:moves_offset + 2 * plies].cast('H')
+        if sys.byteorder != "little":
+            keys = array('H', keys)
+            keys.byteswap()
+        return PackedGame(self.view[offset:offset + RECORD_SIZE], RESULTS[result], keys)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self) -> None:
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        self.view.release()
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
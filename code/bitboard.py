@@ -0,0 +1,138 @@
+"""
+    Bitboard tables and helpers used by Chess.Board.
+    Square index is row*8 + col, the same order as Board.grid: a8 = 0, h8 = 7, a1 = 56, h1 = 63.
+"""
+
+BB_EMPTY = 0
+BB_ALL = 0xFFFF_FFFF_FFFF_FFFF
+BB_SQUARES = [1 << sq for sq in range(64)]
+BB_ROWS = [0xFF << (8 * row) for row in range(8)]
+BB_FILES = [0x0101_0101_0101_0101 << col for col in range(8)]
+BB_RANK_1, BB_RANK_3, BB_RANK_6, BB_RANK_8 = BB_ROWS[7], BB_ROWS[5], BB_ROWS[2], BB_ROWS[0]
+BB_FILE_A, BB_FILE_H = BB_FILES[0], BB_FILES[7]
+BB_LIGHT_SQUARES = sum(1 << sq for sq in range(64) if not (sq & 7) + (sq >> 3) & 1)
+BB_DARK_SQUARES = BB_ALL ^ BB_LIGHT_SQUARES
+
+SQUARE_COORDS = [(sq & 7, sq >> 3) for sq in range(64)]
+
+# (dcol, drow) for every sliding direction; the sign of the index step decides how the first blocker is found
+ROOK_DIRECTIONS = ((0, -1), (0, 1), (1, 0), (-1, 0))
+BISHOP_DIRECTIONS = ((1, -1), (-1, -1), (1, 1), (-1, 1))
+
+
+def square(col: int, row: int) -> int:
+    return row * 8 + col
+
+
+def lsb(bb: int) -> int:
+    return (bb & -bb).bit_length() - 1
+
+
+def msb(bb: int) -> int:
+    return bb.bit_length() - 1
+
+
+def scan_forward(bb: int):
+    while bb:
+        b = bb & -bb
+        yield b.bit_length() - 1
+        bb ^= b
+
+
+def _step_attacks(deltas) -> list:
+    table = []
+    for sq in range(64):
+        c, r = SQUARE_COORDS[sq]
+        mask = 0
+        for dc, dr in deltas:
+            if 0 <= c + dc <= 7 and 0 <= r + dr <= 7:
+                mask |= BB_SQUARES[square(c + dc, r + dr)]
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _step_attacks(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+KING_ATTACKS = _step_attacks(((1, 1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1), (-1, 1), (1, -1)))
+# squares attacked by a pawn of the given color (True - white) standing on a square
+PAWN_ATTACKS = {
+    True: _step_attacks(((-1, -1), (1, -1))),
+    False: _step_attacks(((-1, 1), (1, 1))),
+}
+
+
+def _ray(sq: int, dc: int, dr: int) -> int:
+    c, r = SQUARE_COORDS[sq]
+    mask = 0
+    c, r = c + dc, r + dr
+    while 0 <= c <= 7 and 0 <= r <= 7:
+        mask |= BB_SQUARES[square(c, r)]
+        c, r = c + dc, r + dr
+    return mask
+
+
+RAYS = {d: [_ray(sq, *d) for sq in range(64)] for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+
+def _slide(sq: int, occupied: int, directions) -> int:
+    attacks = 0
+    for dc, dr in directions:
+        ray = RAYS[(dc, dr)][sq]
+        blockers = ray & occupied
+        if blockers:
+            blocker = lsb(blockers) if dr * 8 + dc > 0 else msb(blockers)
+            ray ^= RAYS[(dc, dr)][blocker]
+        attacks |= ray
+    return attacks
+
+
+def _relevant_mask(sq: int, directions) -> int:
+    """ Squares whose occupancy can change the attacks of a slider (the last square of a ray never can)."""
+    mask = 0
+    for dc, dr in directions:
+        ray = RAYS[(dc, dr)][sq]
+        if ray:
+            ray ^= BB_SQUARES[msb(ray) if dr * 8 + dc > 0 else lsb(ray)]
+        mask |= ray
+    return mask
+
+
+ROOK_MASKS = [_relevant_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+
+# attack sets are filled in lazily per (square, relevant occupancy), so importing the module stays cheap
+_ROOK_CACHE = [{} for _ in range(64)]
+_BISHOP_CACHE = [{} for _ in range(64)]
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    key = occupied & ROOK_MASKS[sq]
+    cache = _ROOK_CACHE[sq]
+    attacks = cache.get(key)
+    if attacks is None:
+        attacks = cache[key] = _slide(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    key = occupied & BISHOP_MASKS[sq]
+    cache = _BISHOP_CACHE[sq]
+    attacks = cache.get(key)
+    if attacks is None:
+        attacks = cache[key] = _slide(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def _between_and_line():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for dc, dr in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            full_line = RAYS[(dc, dr)][a] | RAYS[(-dc, -dr)][a] | BB_SQUARES[a]
+            for b in scan_forward(RAYS[(dc, dr)][a]):
+                between[a][b] = RAYS[(dc, dr)][a] & RAYS[(-dc, -dr)][b]
+                line[a][b] = full_line
+    return between, line
+
+
+# BETWEEN[a][b] - squares strictly between two aligned squares, LINE[a][b] - the whole line through both of them
+BETWEEN, LINE = _between_and_line()
@@ -0,0 +1,140 @@
+"""
+    Opening book: a sorted file of (position key, move, weight) entries read through mmap with binary search.
+
+    Entries are 16 bytes like Polyglot's, key (8), move (2), weight (2), learn (4), but the key is Board.zobrist and
+    the move Chess.MOVE_KEY_MASK bits of the packed move, little-endian after binformat's 16 byte header. The
+    entries of a position are stored heaviest first.
+    python book.py build book.bin games.pgn more.uci --plies 24 --min-games 3
+    python book.py query book.bin --moves e2e4
+"""
+import argparse
+import bisect
+import os
+import random
+import struct
+import sys
+from Chess import Board, Move, STANDARD_FEN, MOVE_KEY_MASK, RESULT_WHITE, RESULT_BLACK, RESULT_DRAW
+from binformat import HEADER_SIZE, write_header, map_file, key_view
+
+
+BOOK_MAGIC = b"CHSB"
+VERSION = 2
+
+_ENTRY = struct.Struct("<QHHI")
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        self.path = path
+        self.data = map_file(path, BOOK_MAGIC, VERSION, _ENTRY.size)
+        self.view = memoryview(self.data)
+        self.keys = key_view(self.view)
+
+    @classmethod
+    def open_if_exists(cls, path: str):
+        """ The book at path, None if there is no file (a missing book only means the engine thinks from move one)."""
+        return cls(path) if path and os.path.exists(path) else None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def weights(self, key: int) -> list:
+        """ (move key, weight) of the entries of a position key, heaviest first."""
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key, start)
+        entries = []
+        for i in range(start, end):
+            _, move, weight, _ = _ENTRY.unpack_from(self.data, HEADER_SIZE + i * _ENTRY.size)
+            entries.append((move, weight))
+        return entries
+
+    def choose(self, board: Board, rng: random.Random = None, best: bool = False) -> Move:
+        """ A book move for the board picked at random by weight (the heaviest with best=True), None out of book."""
+        moves = board.book_moves(self)
+        if not moves:
+            return None
+        if best:
+            return moves[0][0]
+        return (rng or random).choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self) -> None:
+        self.keys.release()
+        self.view.release()
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _score(result: str, white_to_move: bool) -> int:
+    """ Polyglot style weight of a game for the side that played the move: 2 for a win, 1 for a draw."""
+    if result == RESULT_DRAW:
+        return 1
+    if result == (RESULT_WHITE if white_to_move else RESULT_BLACK):
+        return 2
+    return 0
+
+
+def build_book(games, path: str, max_plies: int = 24, min_games: int = 1) -> int:
+    """
+        Writes a book of the first max_plies moves of games given as (position keys, move keys, result, white
+        moves first), as position_index.games_from_files yields them, keeping moves played at least min_games
+        times. Returns the number of entries written.
+    """
+    counts = {}
+    for keys, moves, result, white_to_move in games:
+        for i, move in enumerate(moves[:max_plies]):
+            entry = (keys[i], move & MOVE_KEY_MASK)
+            games_played, score = counts.get(entry, (0, 0))
+            counts[entry] = (games_played + 1, score + _score(result, white_to_move))
+            white_to_move = not white_to_move
+    positions = {}
+    for (key, move), (games_played, score) in counts.items():
+        if games_played >= min_games:
+            # a move that never scored still gets weight 1, so it is playable when nothing better is known
+            positions.setdefault(key, []).append((move, max(score, 1)))
+    written = 0
+    with open(path + ".tmp", "wb") as f:
+        write_header(f, BOOK_MAGIC, VERSION, _ENTRY.size)
+        for key in sorted(positions):
+            entries = sorted(positions[key], key=lambda entry: -entry[1])
+            scale = max(1, -(-entries[0][1] // 0xFFFF))
+            for move, weight in entries:
+                f.write(_ENTRY.pack(key, move, max(1, weight // scale), 0))
+                written += 1
+    os.replace(path + ".tmp", path)
+    return written
+
+
+def main():
+    from position_index import games_from_files
+    parser = argparse.ArgumentParser(description="Opening books")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN, UCI or binformat game files")
+    build.add_argument("book")
+    build.add_argument("files", nargs="+")
+    build.add_argument("--plies", type=int, default=24, help="moves from the start of each game that go in")
+    build.add_argument("--min-games", type=int, default=1, help="leave out moves played fewer times")
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    query = commands.add_parser("query", help="book moves of a position")
+    query.add_argument("book")
+    query.add_argument("--fen", default=STANDARD_FEN)
+    query.add_argument("--moves", nargs="*", default=[], help="uci moves played from the fen first")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        written = build_book(games_from_files(args.files, args.workers), args.book, args.plies, args.min_games)
+        print(f"{written} entries", file=sys.stderr)
+        return
+    board = Board(args.fen)
+    board.make_uci(args.moves)
+    with OpeningBook(args.book) as book:
+        for move, weight in board.book_moves(book):
+            print(f"{move.uci()} {weight}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,18 @@
-MAX_FPS = 60
+import os
+
+
+# the repository, data files are found from here whatever the working directory
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MAX_FPS = 60 # while a piece is dragged
+POLL_FPS = 20 # while the computer thinks, to pick up its move
+IDLE_TIMEOUT = 1000 # ms the main loop sleeps waiting for input when nothing moves
+ENGINE_TIME_LIMIT = 1.0 # seconds the computer thinks per move
+ENGINE_HASH_MB = 16 # transposition table budget per engine
+OPENING_BOOK = os.path.join(ROOT_DIR, "books", "book.bin") # built with book.py, the computer plays from it while it has moves
+TABLEBASES = os.path.join(ROOT_DIR, "tablebases") # generated with tablebase.py, endings they cover are not searched
+SERVER_HOST = "localhost" # server.py that online games are played on
+SERVER_PORT = 8765
 WIN_HEIGHT = 650
 WIN_WIDTH = 650
 
@@ -0,0 +1,313 @@
+"""
+    Alpha-beta search engine working on Chess.Board.
+    Iterative deepening with principal variation search, quiescence search and a time/node budget.
+"""
+import time
+from Chess import Board, Move, PIECE_CODES, SYMBOL_CODES, QUEEN, MOVE_CAPTURE, MOVE_KEY_MASK, move_key
+from bitboard import scan_forward
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+
+INF = 1_000_000
+MATE_SCORE = 100_000
+MAX_PLY = 128
+
+PIECE_VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0}
+
+# piece-square tables from white's side, in square order (a8 first); black squares are mirrored with sq ^ 56
+PIECE_SQUARE_TABLES = {
+    'p': (
+          0,   0,   0,   0,   0,   0,   0,   0,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         10,  10,  20,  30,  30,  20,  10,  10,
+          5,   5,  10,  25,  25,  10,   5,   5,
+          0,   0,   0,  20,  20,   0,   0,   0,
+          5,  -5, -10,   0,   0, -10,  -5,   5,
+          5,  10,  10, -20, -20,  10,  10,   5,
+          0,   0,   0,   0,   0,   0,   0,   0),
+    'n': (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50),
+    'b': (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20),
+    'r': (
+          0,   0,   0,   0,   0,   0,   0,   0,
+          5,  10,  10,  10,  10,  10,  10,   5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+          0,   0,   0,   5,   5,   0,   0,   0),
+    'q': (
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20),
+    'k': (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20),
+}
+
+# material plus placement for every (piece code, square), white positive
+_PIECE_SQUARE_SCORES = [None] * 15
+for _piece_type, _table in PIECE_SQUARE_TABLES.items():
+    _PIECE_SQUARE_SCORES[SYMBOL_CODES[_piece_type.upper()]] = [PIECE_VALUES[_piece_type] + _table[sq] for sq in range(64)]
+    _PIECE_SQUARE_SCORES[SYMBOL_CODES[_piece_type]] = [-(PIECE_VALUES[_piece_type] + _table[sq ^ 56]) for sq in range(64)]
+_CODE_VALUES = [0] * 15
+for _symbol, _code in SYMBOL_CODES.items():
+    _CODE_VALUES[_code] = PIECE_VALUES[_symbol.lower()]
+
+
+def evaluate(board: Board) -> int:
+    """ Static evaluation in centipawns from the side to move's point of view."""
+    score = 0
+    pieces = board.pieces
+    for code in PIECE_CODES:
+        table = _PIECE_SQUARE_SCORES[code]
+        for sq in scan_forward(pieces[code]):
+            score += table[sq]
+    return score if board.white_to_move else -score
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """ Mate scores are stored as distance from the stored node, not from the root."""
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Engine:
+    def __init__(self, time_limit: float = 1.0, node_limit: int = None, max_depth: int = 64, hash_mb: float = 16,
+                 tablebases=None):
+        self.tt = TranspositionTable(hash_mb)
+        self.tablebases = tablebases # tablebase.Tablebases, positions they cover are not searched
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.pv: list[Move] = []
+        self.elapsed = 0.0
+
+    @property
+    def nps(self) -> int:
+        return int(self.nodes / self.elapsed) if self.elapsed else 0
+
+    def search(self, board: Board, time_limit: float = None, node_limit: int = None, max_depth: int = None,
+               should_stop=None) -> Move:
+        """
+            Returns the best move found for the side to move within the budget, None if there are no legal moves.
+            The board is searched in place and left as it was. should_stop is polled during the search and
+            stops it early when it returns True.
+        """
+        self.board = board
+        self.should_stop = should_stop
+        self.deadline = time.perf_counter() + (time_limit if time_limit is not None else self.time_limit)
+        self.max_nodes = node_limit if node_limit is not None else self.node_limit
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.pv = []
+        self.pv_moves = {} # zobrist -> move key along the PV of the previous iteration
+        self._pv = [] # packed
+        self.tt.new_search()
+        start = time.perf_counter()
+        root_moves = board.packed_legal_moves
+        if not root_moves:
+            return None
+        score = self._probe(0) if self.tablebases else None
+        if score is not None:
+            best_move = self.tablebases.best_move(board)
+            if best_move is not None:
+                self.depth, self.score = 0, score
+                self._pv = [best_move]
+                self.pv = [Move.from_packed(best_move)]
+                self.elapsed = time.perf_counter() - start
+                return self.pv[0]
+        best_move = root_moves[0]
+        root_length = len(board.undo_log)
+        for depth in range(1, (max_depth or self.max_depth) + 1):
+            try:
+                score = self._negamax(depth, -INF, INF, 0)
+            except SearchTimeout:
+                while len(board.undo_log) > root_length:
+                    board.unmake()
+                break
+            self.depth, self.score = depth, score
+            self._pv = self.pv_table[0][:]
+            self.pv = [Move.from_packed(move) for move in self._pv]
+            if self._pv:
+                best_move = self._pv[0]
+            self._remember_pv()
+            self.elapsed = time.perf_counter() - start
+            if abs(score) >= MATE_SCORE - MAX_PLY:
+                break
+            # the next iteration would not finish in what is left of the budget
+            if time.perf_counter() - start > (self.deadline - start) / 2:
+                break
+        self.elapsed = time.perf_counter() - start
+        return Move.from_packed(best_move)
+
+    def _remember_pv(self) -> None:
+        board = self.board
+        self.pv_moves = {}
+        for move in self._pv:
+            self.pv_moves[board.zobrist] = move_key(move)
+            board.make(move)
+        for _ in self._pv:
+            board.unmake()
+
+    def _probe(self, ply: int) -> int:
+        """ Score of the position from the tablebases, None if they do not cover it."""
+        if bin(self.board.occupied).count("1") > self.tablebases.max_pieces:
+            return None
+        result = self.tablebases.probe(self.board)
+        if result is None:
+            return None
+        wdl, dtm = result
+        # mate scores as if the search had found the mate, the distance capped to stay in the mate range
+        return wdl * (MATE_SCORE - min(ply + dtm, MAX_PLY))
+
+    def _check_limits(self) -> None:
+        if time.perf_counter() > self.deadline or (self.max_nodes and self.nodes >= self.max_nodes) \
+        or (self.should_stop and self.should_stop()):
+            raise SearchTimeout
+
+    def _order_moves(self, moves: list, ply: int, hash_move: int = None) -> list:
+        """ PV or hash move first, then captures by victim/attacker value, promotions, killers and quiet moves."""
+        squares = self.board.squares
+        pv_move = self.pv_moves.get(self.board.zobrist, hash_move)
+        killers = self.killers[ply]
+
+        def key(move):
+            if move & MOVE_KEY_MASK == pv_move:
+                return -INF
+            if move & MOVE_CAPTURE:
+                return -10 * _CODE_VALUES[move >> 18 & 15] + _CODE_VALUES[squares[move & 63]] // 100 - 10_000
+            if move >> 12 & 7:
+                return -9_000
+            if move & MOVE_KEY_MASK in killers:
+                return -8_000
+            return 0
+        return sorted(moves, key=key)
+
+    def _negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        board = self.board
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._check_limits()
+        self.pv_table[ply] = []
+        in_check = board.is_check()
+        if in_check:
+            depth += 1
+        if ply > 0:
+            # one repetition is enough inside the search, the side ahead would not allow it
+            if board.half_moves >= 100 or board.repetitions() or board.is_insufficient_material():
+                return 0
+            if self.tablebases:
+                score = self._probe(ply)
+                if score is not None:
+                    return score
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(alpha, beta, ply)
+
+        entry = self.tt.probe(board.zobrist)
+        hash_move = None
+        if entry:
+            tt_depth, bound, score, hash_move = entry
+            if ply > 0 and tt_depth >= depth:
+                score = score_from_tt(score, ply)
+                if bound == EXACT or bound == LOWER and score >= beta or bound == UPPER and score <= alpha:
+                    return score
+
+        moves = board.packed_legal_moves
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        original_alpha = alpha
+        best = -INF
+        best_move = None
+        for i, move in enumerate(self._order_moves(moves, ply, hash_move)):
+            board.make(move)
+            if i == 0:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # null window first, re-search only when the move might be better than the PV
+                score = -self._negamax(depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.unmake()
+            if score > best:
+                best = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+            if alpha >= beta:
+                if not move & MOVE_CAPTURE and move_key(move) not in self.killers[ply]:
+                    self.killers[ply] = [move_key(move), self.killers[ply][0]]
+                break
+
+        bound = UPPER if best <= original_alpha else LOWER if best >= beta else EXACT
+        self.tt.store(board.zobrist, depth, bound, score_to_tt(best, ply), move_key(best_move))
+        return best
+
+    def _quiescence(self, alpha: int, beta: int, ply: int) -> int:
+        board = self.board
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._check_limits()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        captures = [m for m in board.packed_legal_moves if m & MOVE_CAPTURE or m >> 12 & 7 == QUEEN]
+        for move in self._order_moves(captures, MAX_PLY - 1):
+            board.make(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            board.unmake()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
@@ -0,0 +1,75 @@
+"""
+    Runs Engine.search in a background process, so the render loop never waits for the computer.
+    worker.start(board) -> worker.poll() every frame until it returns a SearchResult; worker.cancel() drops the search.
+"""
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from Chess import Board
+from engine import Engine
+from tablebase import Tablebases
+
+
+SearchResult = namedtuple("SearchResult", "uci depth score nodes nps")
+
+# worker process state, set up once by _init_worker
+_engine = None
+_search_id = None
+
+
+def _init_worker(time_limit: float, hash_mb: float, tablebases: str, search_id) -> None:
+    global _engine, _search_id
+    _engine = Engine(time_limit=time_limit, hash_mb=hash_mb, tablebases=Tablebases.open_if_exists(tablebases))
+    _search_id = search_id
+
+
+def _search(fen: str, zobrist_history: list, search_id: int) -> SearchResult:
+    board = Board(fen)
+    board.zobrist_history = zobrist_history
+    # a newer start() or a cancel() changes the shared id and stops this search
+    move = _engine.search(board, should_stop=lambda: _search_id.value != search_id)
+    return SearchResult(move.uci() if move else None, _engine.depth, _engine.score, _engine.nodes, _engine.nps)
+
+
+class EngineWorker:
+    def __init__(self, time_limit: float = 1.0, hash_mb: float = 16, tablebases: str = None):
+        self.time_limit = time_limit
+        self.hash_mb = hash_mb
+        self.tablebases = tablebases # directory of tablebase.py tables
+        self._search_id = multiprocessing.Value('i', 0)
+        self._executor = None
+        self._future = None
+
+    @property
+    def busy(self) -> bool:
+        return self._future is not None
+
+    def start(self, board: Board) -> None:
+        """ Starts searching the position of the board, a search still running is cancelled."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                 initargs=(self.time_limit, self.hash_mb, self.tablebases, self._search_id))
+        with self._search_id.get_lock():
+            self._search_id.value += 1
+            search_id = self._search_id.value
+        self._future = self._executor.submit(_search, board.get_fen(), list(board.zobrist_history), search_id)
+
+    def poll(self) -> SearchResult:
+        """ The result of the finished search, None while it is still running or if nothing was started."""
+        if self._future is None or not self._future.done():
+            return None
+        future, self._future = self._future, None
+        return future.result()
+
+    def cancel(self) -> None:
+        if self._future is None:
+            return
+        with self._search_id.get_lock():
+            self._search_id.value += 1
+        self._future = None
+
+    def shutdown(self) -> None:
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
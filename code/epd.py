@@ -0,0 +1,94 @@
+"""
+    FEN/EPD files in bulk: positions are read line by line and come out as Boards or as zobrist keys,
+    the keys without building a Board at all.
+    python epd.py positions.epd --hashes
+"""
+import argparse
+import sys
+import time
+from Chess import Board, fen_key
+
+
+def split_operations(text: str) -> dict:
+    """ EPD operations 'bm e4; id "x";' -> {'bm': 'e4', 'id': 'x'}, quoted operands keep their semicolons."""
+    operations = {}
+    operation, quoted = "", False
+    for ch in text + ";":
+        if ch == '"':
+            quoted = not quoted
+        if ch == ';' and not quoted:
+            opcode, _, operand = operation.strip().partition(' ')
+            if opcode:
+                operations[opcode] = operand.strip().strip('"')
+            operation = ""
+        else:
+            operation += ch
+    return operations
+
+
+def parse_epd(line: str) -> tuple:
+    """ (fen, operations) of an EPD line; the clocks come from the hmvc and fmvn operations if present."""
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise Exception(f"Invalid EPD, expected 4 fields: {line}")
+    operations = split_operations(fields[4]) if len(fields) > 4 else {}
+    fen = " ".join(fields[:4]) + f" {operations.get('hmvc', '0')} {operations.get('fmvn', '1')}"
+    return fen, operations
+
+
+def format_epd(board: Board, operations: dict = None) -> str:
+    fen = board.get_fen().rsplit(" ", 2)[0]
+    if not operations:
+        return fen
+    ops = " ".join(f'{opcode} "{operand}";' if " " in operand else f"{opcode} {operand};"
+                   for opcode, operand in operations.items())
+    return f"{fen} {ops}"
+
+
+def _fen_of(line: str) -> str:
+    """ FEN part of a FEN or EPD line; a line is EPD when its fifth field is not a number."""
+    fields = line.split(None, 5)
+    if len(fields) > 4 and not fields[4].isdigit():
+        return parse_epd(line)[0]
+    return line
+
+
+def read_positions(lines, hashes: bool = False, skip_invalid: bool = False):
+    """
+        Yields a Board (or its zobrist key with hashes=True) for every FEN or EPD line, blank lines and lines
+        starting with # are skipped. An invalid line raises with its line number unless skip_invalid is set.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            fen = _fen_of(line)
+            if hashes:
+                yield fen_key(fen)
+            else:
+                yield Board(fen)
+        except Exception as e:
+            if not skip_invalid:
+                raise Exception(f"line {number}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate FEN/EPD files and time the loading")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--hashes", action="store_true", help="only compute the position keys")
+    parser.add_argument("--skip-invalid", action="store_true")
+    args = parser.parse_args()
+
+    count = 0
+    start = time.perf_counter()
+    for path in args.files:
+        with open(path) as f:
+            for _ in read_positions(f, args.hashes, args.skip_invalid):
+                count += 1
+    elapsed = time.perf_counter() - start
+    print(f"positions {count}  {elapsed:.2f}s  {count / elapsed if elapsed else 0:.0f} positions/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
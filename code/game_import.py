@@ -0,0 +1,245 @@
+"""
+    Streaming import of PGN and UCI move-list files: games are read one at a time, replayed on Chess.Board and
+    yielded as validated packed moves with the position keys, so memory does not grow with the file.
+    python game_import.py games.pgn --workers 4 --output games.bin
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Chess import Board, STANDARD_FEN, RESULTS, RESULT_UNFINISHED, uci_key
+from binformat import GameWriter
+
+
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+
+
+class ImportedGame:
+    """
+        One replayed game: moves[i] (packed) was played in the position with zobrist key keys[i], the last key
+        is the position the game ended (or stopped at an error) in.
+    """
+    __slots__ = ('index', 'headers', 'fen', 'moves', 'keys', 'result', 'error')
+
+    def __init__(self, index: int, headers: dict, fen: str, result: str):
+        self.index = index
+        self.headers = headers
+        self.fen = fen
+        self.moves = array('I')
+        self.keys = array('Q')
+        self.result = result
+        self.error = None # text of the first problem, the moves before it are kept
+
+    @property
+    def plies(self) -> int:
+        return len(self.moves)
+
+
+def split_pgn(lines):
+    """ Yields the text of every game of a PGN stream; a header line after movetext starts the next game."""
+    game = []
+    in_movetext = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('[') and in_movetext:
+            yield "\n".join(game)
+            game, in_movetext = [], False
+        if stripped and not stripped.startswith('['):
+            in_movetext = True
+        game.append(stripped)
+    if any(game):
+        yield "\n".join(game)
+
+
+def split_uci(lines):
+    """ One game per non-empty line, lines starting with # are skipped."""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('#'):
+            yield stripped
+
+
+def _movetext_tokens(text: str):
+    """ Moves of PGN movetext with comments, variations, NAGs and move numbers dropped."""
+    depth = 0
+    comment = False
+    for line in text.split("\n"):
+        if not comment and line.startswith('%'):
+            continue
+        token = ""
+        for ch in line + "\n":
+            if comment:
+                comment = ch != '}'
+            elif ch == '{':
+                comment = True
+            elif ch == ';':
+                break
+            elif ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+            elif depth == 0 and not ch.isspace():
+                token += ch
+                continue
+            if token:
+                yield token
+                token = ""
+        if token and depth == 0:
+            yield token
+
+
+def parse_pgn(text: str) -> tuple:
+    """ (headers, move tokens, result) of a PGN game."""
+    headers = {}
+    movetext = []
+    for line in text.split("\n"):
+        match = _HEADER.match(line) if line.startswith('[') else None
+        if match:
+            headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        else:
+            movetext.append(line)
+    tokens, result = [], headers.get("Result", RESULT_UNFINISHED)
+    for token in _movetext_tokens("\n".join(movetext)):
+        token = _MOVE_NUMBER.sub('', token)
+        if not token or token.startswith('$'):
+            continue
+        if token in RESULTS:
+            result = token
+            continue
+        tokens.append(token)
+    return headers, tokens, result
+
+
+def parse_uci(text: str) -> tuple:
+    """ (headers, move tokens, result) of a line of uci moves, a result may come first or last."""
+    tokens = text.split()
+    result = RESULT_UNFINISHED
+    if tokens and tokens[0] in RESULTS:
+        result = tokens.pop(0)
+    elif tokens and tokens[-1] in RESULTS:
+        result = tokens.pop()
+    return {}, tokens, result
+
+
+def replay(index: int, text: str, fmt: str) -> ImportedGame:
+    """ Parses one game and plays it out, stopping at the first illegal or unreadable move."""
+    headers, tokens, result = parse_pgn(text) if fmt == "pgn" else parse_uci(text)
+    fen = headers.get("FEN", STANDARD_FEN)
+    game = ImportedGame(index, headers, fen, result)
+    try:
+        board = Board(fen)
+    except Exception as e:
+        game.error = f"{e}: {fen}"
+        return game
+    game.keys.append(board.zobrist)
+    for token in tokens:
+        try:
+            if fmt == "pgn":
+                packed = board.parse_san(token).packed
+            else:
+                packed = board.legal_index.get(uci_key(token))
+                if packed is None:
+                    raise Exception(f"Invalid move {token}")
+        except Exception as e:
+            game.error = f"{e} at ply {len(game.moves) + 1}"
+            break
+        game.moves.append(packed)
+        board.make(packed)
+        game.keys.append(board.zobrist)
+    return game
+
+
+def _replay_batch(batch: list, fmt: str) -> list:
+    return [replay(index, text, fmt) for index, text in batch]
+
+
+def detect_format(path: str, first_line: str = "") -> str:
+    if path.lower().endswith(".pgn") or first_line.lstrip().startswith('['):
+        return "pgn"
+    return "uci"
+
+
+def _batches(texts, batch_size: int):
+    batch = []
+    for index, text in enumerate(texts):
+        batch.append((index, text))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _chain_first(first: str, lines):
+    if first:
+        yield first
+    yield from lines
+
+
+def import_games(source, fmt: str = None, workers: int = 1, batch_size: int = 256):
+    """
+        Yields an ImportedGame for every game of source (a path or an iterable of lines) in file order.
+        With workers > 1 batches are replayed on a process pool; at most two batches per worker are in
+        flight, so memory stays bounded however large the file is.
+    """
+    stream = open(source, encoding="utf-8", errors="replace") if isinstance(source, str) else source
+    try:
+        lines = iter(stream)
+        first = next(lines, "")
+        fmt = fmt or detect_format(source if isinstance(source, str) else "", first)
+        lines = _chain_first(first, lines)
+        texts = split_pgn(lines) if fmt == "pgn" else split_uci(lines)
+        if workers <= 1:
+            for index, text in enumerate(texts):
+                yield replay(index, text, fmt)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for batch in _batches(texts, batch_size):
+                pending.append(executor.submit(_replay_batch, batch, fmt))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+    finally:
+        if isinstance(source, str):
+            stream.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and validate PGN or UCI game files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--format", choices=("pgn", "uci"), help="detected from the file by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--errors", action="store_true", help="print every game that failed to replay")
+    parser.add_argument("--output", help="binary game file (binformat) to write the games without errors to")
+    args = parser.parse_args()
+
+    games = plies = errors = 0
+    writer = GameWriter(args.output) if args.output else None
+    start = time.perf_counter()
+    for path in args.files:
+        for game in import_games(path, args.format, args.workers, args.batch_size):
+            games += 1
+            plies += game.plies
+            if game.error:
+                errors += 1
+                if args.errors:
+                    print(f"{path} game {game.index + 1}: {game.error}", file=sys.stderr)
+            elif writer:
+                writer.add(Board(game.fen), game.moves, game.result)
+    if writer:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"games {games}  plies {plies}  errors {errors}  {elapsed:.2f}s  "
+          f"{games / elapsed if elapsed else 0:.0f} games/s  {plies / elapsed if elapsed else 0:.0f} plies/s")
+
+
+if __name__ == "__main__":
+    main()
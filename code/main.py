@@ -4,11 +4,6 @@ from config import *
 from scene import *
 
 
-def Render_Text(what, color, where, window):
-    font = pygame.font.Font(None, 30)
-    text = font.render(what, 1, pygame.Color(color))
-    window.blit(text, where)
-
 def main():
     screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
     pygame.display.set_caption("Chess")
@@ -17,16 +12,25 @@ def main():
     manager = SceneManager()
     manager.go_to(GameScene())
     
+    frames = 0
     while True:
-        screen.fill('black')
-        main_clock.tick(MAX_FPS)
-        manager.scene.handle_events()
+        fps = manager.scene.frame_rate()
+        main_clock.tick(fps or MAX_FPS)
+        events = pygame.event.get()
+        if not fps and not events:
+            # nothing moves on its own, sleep until input comes (or the timeout, so the loop still turns over)
+            event = pygame.event.wait(IDLE_TIMEOUT)
+            events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+        manager.scene.handle_events(events)
         manager.scene.update()
-        manager.scene.render(screen)
-        
-        
-        Render_Text(str(int(main_clock.get_fps())), (255, 255, 255), (0, 0), screen)
-        pygame.display.update()
+        dirty = manager.scene.render(screen)
+        # nothing changed, nothing is sent to the display
+        if dirty:
+            pygame.display.update(dirty)
+
+        frames += 1
+        if frames % MAX_FPS == 0:
+            pygame.display.set_caption(f"Chess  {int(main_clock.get_fps())} fps")
         
 
 if __name__ == "__main__":
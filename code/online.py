@@ -0,0 +1,93 @@
+"""
+    Client side of server.py: the connection runs on an asyncio loop in a background thread, so the render loop
+    never waits for the network.
+    client = OnlineClient(host, port) -> client.poll() every frame until it returns a message; client.send("move", uci).
+    notify is called from the network thread after each message, e.g. to wake a loop that sleeps waiting for input.
+"""
+import asyncio
+import queue
+import threading
+
+
+class OnlineClient:
+    def __init__(self, host: str, port: int, notify=None):
+        self.host = host
+        self.port = port
+        self.notify = notify
+        self.messages = queue.Queue() # lists of words from the server, ["closed", reason] when the connection ends
+        self._writer = None
+        self._closed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """ The network thread: talks to the server until the connection ends, then closes the loop."""
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._talk())
+        finally:
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def _talk(self) -> None:
+        try:
+            reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            self._put(["closed", f"no server at {self.host}:{self.port}"])
+            return
+        try:
+            if self._closed:
+                # closed while connecting, the server never sees it as a player
+                return
+            self._write("play")
+            try:
+                async for line in reader:
+                    self._put(line.decode("ascii", "replace").split())
+            except ConnectionError:
+                pass
+            self._put(["closed", "connection lost"])
+        finally:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def _put(self, message: list) -> None:
+        self.messages.put(message)
+        if self.notify:
+            self.notify()
+
+    def _write(self, line: str) -> None:
+        if self._writer and not self._writer.is_closing():
+            self._writer.write((line + "\n").encode())
+
+    def _call(self, callback, *args) -> None:
+        """ Runs the callback on the network thread, nothing once the connection ended and the loop is closed."""
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass
+
+    def send(self, *words) -> None:
+        self._call(self._write, " ".join(words))
+
+    def poll(self) -> list:
+        """ The next message, None if nothing came yet."""
+        try:
+            return self.messages.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        """ Ends the connection; the network thread then closes its event loop and exits."""
+        self._closed = True
+        if self._writer:
+            self._call(self._writer.close)
@@ -0,0 +1,84 @@
+"""
+    Perft suite for the move generator.
+    python perft.py                  - every suite position up to depth 3
+    python perft.py --depth 4        - deeper, positions without a known count at that depth are cut short
+    python perft.py --fen FEN --divide --depth 3
+"""
+import argparse
+import sys
+import time
+from Chess import Board, STANDARD_FEN
+
+
+# (name, fen, known node counts for depth 1, 2, ...)
+PERFT_SUITE = [
+    ("start position", STANDARD_FEN, (20, 400, 8902, 197281, 4865609)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", (48, 2039, 97862, 4085603)),
+    ("rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238, 674624)),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", (6, 264, 9467, 422333)),
+    ("discovered checks", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", (44, 1486, 62379, 2103487)),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", (46, 2079, 89890, 3894594)),
+    ("illegal en passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", (18, 92, 1670, 10138)),
+    ("illegal en passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", (13, 102, 1266, 10276)),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", (15, 126, 1928, 13931)),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", (11, 133, 1442, 19174)),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", (9, 40, 472, 2661)),
+    ("underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", (6, 27, 273, 1329)),
+    ("castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", (15, 66, 1198, 6399)),
+]
+
+
+def run_suite(depth: int, positions=PERFT_SUITE) -> int:
+    """ Runs perft on every position and prints nodes, nps and mismatches. Returns the number of mismatches."""
+    mismatches = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in positions:
+        d = min(depth, len(counts))
+        board = Board(fen)
+        start = time.perf_counter()
+        nodes = board.perft(d)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        ok = nodes == counts[d - 1]
+        mismatches += not ok
+        print(f"{name:<24} depth {d}  nodes {nodes:>9}  expected {counts[d - 1]:>9}  "
+              f"{elapsed:7.2f}s  {int(nodes / max(elapsed, 1e-9)):>7} nps  {'ok' if ok else 'MISMATCH'}")
+    print(f"total nodes {total_nodes}  {total_time:.2f}s  {int(total_nodes / max(total_time, 1e-9))} nps  mismatches {mismatches}")
+    return mismatches
+
+
+def run_divide(fen: str, depth: int) -> None:
+    board = Board(fen)
+    start = time.perf_counter()
+    result = board.divide(depth)
+    elapsed = time.perf_counter() - start
+    for uci, nodes in sorted(result.items()):
+        print(f"{uci}: {nodes}")
+    total = sum(result.values())
+    print(f"moves {len(result)}  nodes {total}  {elapsed:.2f}s  {int(total / max(elapsed, 1e-9))} nps")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move generator perft suite")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fen", help="run a single position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="split the single position count by the first move")
+    args = parser.parse_args()
+
+    if args.fen:
+        if args.divide:
+            run_divide(args.fen, args.depth)
+        else:
+            board = Board(args.fen)
+            start = time.perf_counter()
+            nodes = board.perft(args.depth)
+            elapsed = time.perf_counter() - start
+            print(f"nodes {nodes}  {elapsed:.2f}s  {int(nodes / max(elapsed, 1e-9))} nps")
+        return
+    sys.exit(1 if run_suite(args.depth) else 0)
+
+
+if __name__ == "__main__":
+    main()
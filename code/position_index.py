@@ -0,0 +1,247 @@
+"""
+    On-disk index of every position of a game collection, keyed by Board.zobrist.
+
+    The index is a directory of sorted segments. Every append writes new segments, a lookup binary-searches
+    each of them through mmap and compact merges them into one. An entry is 16 bytes: position key (8),
+    game number (4), key of the move played next (2, 0 when the game ended there) and the result (1).
+    python position_index.py build games.idx games.pgn more.uci archive.bin
+    python position_index.py query games.idx --moves e2e4 e7e5
+"""
+import argparse
+import bisect
+import heapq
+import os
+import struct
+import sys
+from Chess import Board, Move, STANDARD_FEN, MOVE_KEY_MASK, RESULT_CODES, UNFINISHED_CODE, WHITE_WIN_CODE, \
+    BLACK_WIN_CODE, DRAW_CODE
+from binformat import HEADER_SIZE, GameFile, write_header, map_file, key_view
+
+
+SEGMENT_MAGIC = b"CHSI"
+META_MAGIC = b"CHSM"
+VERSION = 2
+MAX_SEGMENTS = 8 # more than this after an append and the segments are merged
+
+_ENTRY = struct.Struct("<QIHBx")
+_META = struct.Struct("<4sIQQ")
+
+
+class MoveStats:
+    """ How often a move was played from a position and how those games ended."""
+    __slots__ = ('move', 'games', 'white_wins', 'draws', 'black_wins')
+
+    def __init__(self, move: Move):
+        self.move = move
+        self.games = 0
+        self.white_wins = 0
+        self.draws = 0
+        self.black_wins = 0
+
+    def add(self, result: int) -> None:
+        """ Counts a game by its result code (Chess.RESULT_CODES)."""
+        self.games += 1
+        if result == WHITE_WIN_CODE:
+            self.white_wins += 1
+        elif result == BLACK_WIN_CODE:
+            self.black_wins += 1
+        elif result == DRAW_CODE:
+            self.draws += 1
+
+    def __str__(self) -> str:
+        return f"{self.move.uci()} {self.games} games  +{self.white_wins} ={self.draws} -{self.black_wins}"
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.path = path
+        self.data = map_file(path, SEGMENT_MAGIC, VERSION, _ENTRY.size)
+        self.view = memoryview(self.data)
+        self.keys = key_view(self.view)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find(self, key: int):
+        """ Yields (game, move key, result) of the entries of the position."""
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key, start)
+        for i in range(start, end):
+            _, game, move, result = _ENTRY.unpack_from(self.data, HEADER_SIZE + i * _ENTRY.size)
+            yield game, move, result
+
+    def entries(self):
+        for offset in range(HEADER_SIZE, len(self.data), _ENTRY.size):
+            yield _ENTRY.unpack_from(self.data, offset)
+
+    def close(self) -> None:
+        self.keys.release()
+        self.view.release()
+        self.data.close()
+
+
+class PositionIndex:
+    def __init__(self, path: str):
+        """ Opens the index directory, creating an empty index if it does not exist."""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.games = 0
+        self.next_segment = 0
+        meta = os.path.join(path, "meta")
+        if os.path.exists(meta):
+            with open(meta, "rb") as f:
+                magic, version, self.games, self.next_segment = _META.unpack(f.read(_META.size))
+            if magic != META_MAGIC or version != VERSION:
+                raise Exception(f"{path} is not a version {VERSION} position index")
+        self.segments = [Segment(os.path.join(path, name)) for name in sorted(os.listdir(path)) if name.endswith(".seg")]
+
+    def _write_meta(self) -> None:
+        meta = os.path.join(self.path, "meta")
+        with open(meta + ".tmp", "wb") as f:
+            f.write(_META.pack(META_MAGIC, VERSION, self.games, self.next_segment))
+        os.replace(meta + ".tmp", meta)
+
+    def _write_segment(self, entries) -> None:
+        """ Writes already sorted entries as the next segment."""
+        name = os.path.join(self.path, f"{self.next_segment:08d}.seg")
+        self.next_segment += 1
+        with open(name + ".tmp", "wb") as f:
+            write_header(f, SEGMENT_MAGIC, VERSION, _ENTRY.size)
+            for entry in entries:
+                f.write(_ENTRY.pack(*entry))
+        os.replace(name + ".tmp", name)
+        self.segments.append(Segment(name))
+
+    def add_games(self, games, buffer_entries: int = 1 << 20) -> int:
+        """
+            Appends games given as (position keys, move keys, result, ...): keys[i] is the position move i was
+            played in and the one extra last key the final position. At most buffer_entries are held in memory before
+            they are sorted and written out. Returns the number of games added.
+        """
+        buffer = []
+        added = 0
+        for keys, moves, result, *_ in games:
+            code = RESULT_CODES.get(result, UNFINISHED_CODE)
+            game = self.games + added
+            for i, key in enumerate(keys):
+                buffer.append((key, game, moves[i] & MOVE_KEY_MASK if i < len(moves) else 0, code))
+            added += 1
+            if len(buffer) >= buffer_entries:
+                buffer.sort()
+                self._write_segment(buffer)
+                buffer = []
+        if buffer:
+            buffer.sort()
+            self._write_segment(buffer)
+        self.games += added
+        self._write_meta()
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+        return added
+
+    def compact(self) -> None:
+        """ Merges all segments into one, streaming through the sorted entries."""
+        if len(self.segments) <= 1:
+            return
+        old = self.segments
+        self.segments = []
+        self._write_segment(heapq.merge(*(segment.entries() for segment in old)))
+        self._write_meta()
+        for segment in old:
+            segment.close()
+            os.remove(segment.path)
+
+    def entries(self, key: int):
+        for segment in self.segments:
+            yield from segment.find(key)
+
+    def lookup(self, board: Board) -> list:
+        """ MoveStats of every move played from the board's position, most played first."""
+        stats = {}
+        for _, move_key, result in self.entries(board.zobrist):
+            if not move_key:
+                continue
+            if move_key not in stats:
+                packed = board.legal_index.get(move_key)
+                if packed is None:
+                    continue # a different position with the same key
+                stats[move_key] = MoveStats(Move.from_packed(packed))
+            stats[move_key].add(result)
+        return sorted(stats.values(), key=lambda s: -s.games)
+
+    def game_numbers(self, board: Board) -> list:
+        """ Numbers (in the order they were added) of the games that reached the position."""
+        return sorted({game for game, _, _ in self.entries(board.zobrist)})
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def games_from_files(paths: list, workers: int = 1):
+    """ (position keys, move keys, result, white moves first) of every game in PGN, UCI or binformat game files."""
+    from game_import import import_games
+    for path in paths:
+        if path.endswith(".bin"):
+            with open(path, "rb") as f:
+                binary = f.read(4) == b"CHSG"
+        else:
+            binary = False
+        if binary:
+            game_file = GameFile(path)
+            for index in range(len(game_file)):
+                game = game_file[index]
+                keys, moves = [], []
+                board = None
+                for board, move in game.replay():
+                    keys.append(board.zobrist)
+                    moves.append(move)
+                keys.append(board.zobrist if board else game.board().zobrist)
+                # bit 0 of the state word, the last 8 bytes of the record, is the side to move
+                yield keys, moves, game.result, bool(game.record[24] & 1)
+                del game
+            game_file.close()
+        else:
+            for game in import_games(path, workers=workers):
+                if not game.error:
+                    yield game.keys, game.moves, game.result, game.fen.split()[1] != 'b'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Position index of game collections")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="add the games of the files to the index")
+    build.add_argument("index")
+    build.add_argument("files", nargs="+")
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    query = commands.add_parser("query", help="move statistics of a position")
+    query.add_argument("index")
+    query.add_argument("--fen", default=STANDARD_FEN)
+    query.add_argument("--moves", nargs="*", default=[], help="uci moves played from the fen first")
+    compact = commands.add_parser("compact", help="merge the segments of the index")
+    compact.add_argument("index")
+    args = parser.parse_args()
+
+    with PositionIndex(args.index) as index:
+        if args.command == "build":
+            added = index.add_games(games_from_files(args.files, args.workers))
+            print(f"added {added} games, {index.games} in the index, {len(index.segments)} segments", file=sys.stderr)
+        elif args.command == "compact":
+            index.compact()
+        else:
+            board = Board(args.fen)
+            board.make_uci(args.moves)
+            print(f"{len(index.game_numbers(board))} games")
+            for stats in index.lookup(board):
+                print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,29 @@
 import sys
 import pygame
 from ui.button import Button
+from ui import assets
+from ui.pieces import piece_image, render_piece, next_theme
 from config import *
 from Chess import *
-from functools import reduce
+from engine_worker import EngineWorker
+from book import OpeningBook
+from tablebase import Tablebases, DRAW, LOSS
+from online import OnlineClient
 
 
 
-HIHGLIGHT_SQUARE = pygame.image.load("../images/highlight_square.png")
-MOVE_IMAGE =  pygame.image.load("../images/move.png")
-TARGET_SQUARE = pygame.image.load("../images/target.png")
-MAIN_MENU_BG_IMAGE = pygame.image.load("../images/main_menu.png")
 RANK_NAMES = ["1", "2", "3", "4", "5", "6", "7", "8"]
 FILE_NAMES = ["a", "b", "c", "d", "e", "f", "g", "h"]
-MENU_FONT = pygame.font.Font("../fonts/Segoe-UI-Bold.ttf", 20)
+MENU_FONT = "Segoe-UI-Bold.ttf"
+BLANK_SQUARE = ('.', False, None, False) # what GameScene.square_looks leaves out
+NETWORK_EVENT = pygame.event.custom_type() # posted when a server message comes in, wakes the main loop
 
-CAPTURING_SOUND = pygame.mixer.Sound("../audio/capturing.mp3")
-CASTLING_SOUND = pygame.mixer.Sound("../audio/castling.mp3")
-MOVE_SOUND = pygame.mixer.Sound("../audio/move.mp3")
-PROMOTION_SOUND = pygame.mixer.Sound("../audio/promotion.mp3")
-CHECK_SOUND = pygame.mixer.Sound("../audio/check.mp3")
-
-ARROW_IMG = pygame.image.load("../images/arrow.png")
-FLAG_IMG = pygame.image.load("../images/white_flag.png")
 
 def Render_Text(what, color, where, window, size=15):
-    font = pygame.font.Font(None, size)
-    text = font.render(what, 1, pygame.Color(color))
-    window.blit(text, where)
+    window.blit(assets.text(what, color, size), where)
 
 def get_text(text, color, size=15, font = None):
-    if not font:
-        font = pygame.font.Font(font, size)
-    text = font.render(text, 1, pygame.Color(color))
-    return text
-
-RANKS = [get_text(r, 'grey', size=25) for r in RANK_NAMES]
-FILES = [get_text(f, 'grey', size=25) for f in FILE_NAMES]
+    return assets.text(text, color, size, font)
 
 def flip_coordinates(x, y):
     return 7 - x, 7 - y
@@ -48,6 +35,7 @@ class Scene(object):
         self.game_window = pygame.display.get_surface()
 
     def render(self, screen):
+        """ Draws what changed since the last call and returns the changed rects (an empty list when idle)."""
         raise NotImplementedError
 
     def update(self):
@@ -56,32 +44,47 @@ class Scene(object):
     def handle_events(self, events):
         raise NotImplementedError
 
+    def frame_rate(self) -> int:
+        """ Frames per second the scene needs with no input coming, 0 when it only changes on events."""
+        return 0
+
 
 class MainMenuScene(Scene):
     def __init__(self):
         super(MainMenuScene, self).__init__()
-        self.vs_computer_button = Button((200, 221), (250, 50), 4, text='VS COMPUTER', font=MENU_FONT, border_radius=8)
-        self.two_player_online_button = Button((200, 298), (250, 50), 4, text='VS PLAYER ONLINE', font=MENU_FONT, border_radius=8)
-        self.two_player_offline_button = Button((200, 376), (250, 50), 4, text='VS PLAYER OFFLINE', font=MENU_FONT, border_radius=8)
-        self.bg_image = MAIN_MENU_BG_IMAGE
+        self.vs_computer_button = Button((200, 221), (250, 50), 4, text='VS COMPUTER', font=assets.font(MENU_FONT, 20), border_radius=8)
+        self.two_player_online_button = Button((200, 298), (250, 50), 4, text='VS PLAYER ONLINE', font=assets.font(MENU_FONT, 20), border_radius=8)
+        self.two_player_offline_button = Button((200, 376), (250, 50), 4, text='VS PLAYER OFFLINE', font=assets.font(MENU_FONT, 20), border_radius=8)
+        self.bg_image = assets.image("main_menu.png", alpha=False)
+        self.drawn = False
 
     def render(self, screen):
-        # screen.fill('black')
-        screen.blit(self.bg_image, (0, 0))
-        self.vs_computer_button.render(screen)
-        self.two_player_online_button.render(screen)
-        self.two_player_offline_button.render(screen)
+        """ Draws the menu once, then only the buttons whose look changed. Returns the dirty rects."""
+        buttons = (self.vs_computer_button, self.two_player_online_button, self.two_player_offline_button)
+        if not self.drawn:
+            self.drawn = True
+            screen.blit(self.bg_image, (0, 0))
+            for button in buttons:
+                button.redraw(screen, self.bg_image, force=True)
+            return [screen.get_rect()]
+        return [rect for rect in (button.redraw(screen, self.bg_image) for button in buttons) if rect]
 
     def update(self):
-        self.vs_computer_button.check_click()
-        self.two_player_online_button.check_click()
-        if self.two_player_offline_button.check_click():
-            self.manager.go_to(GameScene())
+        pass
 
-    def handle_events(self):
-        for event in pygame.event.get():
+    def handle_events(self, events):
+        for event in events:
             if event.type == pygame.QUIT:
                 sys.exit()
+            if self.vs_computer_button.handle_event(event):
+                self.manager.go_to(GameScene(white_is_human=True, black_is_human=False))
+                return
+            if self.two_player_online_button.handle_event(event):
+                self.manager.go_to(GameScene(white_is_human=False, black_is_human=False, online=True))
+                return
+            if self.two_player_offline_button.handle_event(event):
+                self.manager.go_to(GameScene())
+                return
         
 
 class SceneManager(object):
@@ -108,8 +111,8 @@ class PromotionBox:
         return self.promotion_type
 
     def handle_events(self, event):
-        mx, my = pygame.mouse.get_pos()
         if event.type == pygame.MOUSEBUTTONDOWN:
+            mx, my = event.pos
             if self.rect.collidepoint(mx, my):
                 c, r = (mx - self.x) // SQUARE_SIZE, (my - self.y) // SQUARE_SIZE
                 self.promotion_type = self.pieces_symbols[r].lower()
@@ -119,19 +122,19 @@ class PromotionBox:
     def render(self, screen):
         pygame.draw.rect(screen, 'white', self.rect, border_radius=5)
         for i, symbol in enumerate(self.pieces_symbols):
-            screen.blit(PIECE_IMAGE[symbol], (self.x, self.y + i*SQUARE_SIZE))
+            screen.blit(piece_image(symbol), (self.x, self.y + i*SQUARE_SIZE))
 
 
 class WinnerBox:
-    def __init__(self, x=151, y=251, winner=None):
-        self.bg = pygame.image.load('../images/winner_menu_bg.png')
+    def __init__(self, x=151, y=251, winner=None, text=None):
+        self.bg = assets.image("winner_menu_bg.png")
         self.winner = winner
         self.x = x
         self.y = y
         
         self.text_color = "#144757"
-        text = f"{winner} won" if winner else "Draw"
-        self.text_surf = get_text(text, self.text_color, size=18, font=MENU_FONT)
+        self.text = text or (f"{winner} won" if winner else "Draw")
+        self.text_surf = get_text(self.text, self.text_color, size=18, font=MENU_FONT)
         
         self.back_to_menu = Button((self.x + 22, self.y+ 74), (80, 25), 1, border_radius=5, text="Menu")
         self.rematch = Button((self.x + 135, self.y+ 74), (80, 25), 1, border_radius=5, text='Rematch')
@@ -143,8 +146,23 @@ class WinnerBox:
         screen.blit(self.text_surf, (self.x + 70, self.y + 20))
 
 
+class WaitingBox:
+    """ Shown while an online game waits for the server to pair the player, with a way back to the menu."""
+    def __init__(self, x=151, y=251):
+        self.bg = assets.image("winner_menu_bg.png")
+        self.x = x
+        self.y = y
+        self.text_surf = get_text("Waiting for opponent", "#144757", size=18, font=MENU_FONT)
+        self.back_to_menu = Button((self.x + 80, self.y + 74), (80, 25), 1, border_radius=5, text="Menu")
+
+    def render(self, screen):
+        screen.blit(self.bg, (self.x, self.y))
+        self.back_to_menu.render(screen)
+        screen.blit(self.text_surf, self.text_surf.get_rect(centerx=self.x + self.bg.get_width() // 2, y=self.y + 20))
+
+
 class GameScene(Scene):
-    def __init__(self, white_is_human=True, black_is_human=True):
+    def __init__(self, white_is_human=True, black_is_human=True, online=False):
         super(GameScene, self).__init__()
         # self.board = Board(fen="8/2P5/2KP4/5k2/5pp1/8/8/8 b - - 0 1", x=30, y=75)
         self.board = Board(x=30, y=75)
@@ -152,8 +170,9 @@ class GameScene(Scene):
         self.check = False
         self.mate = False
         self.stalemate = False
+        self.draw_reason = None # stalemate, insufficient material, fifty moves or threefold repetition
         self.is_promotion = False
-        self.board_img = pygame.image.load("..\\images\\board.jpg")
+        self.board_img = assets.image("board.jpg", alpha=False)
         self.promotion_menu = None
         self.drag_piece = False
         self.clicks_on_selpiece = 0
@@ -162,16 +181,30 @@ class GameScene(Scene):
         self.game_over = False
         self.winner = None # w/b/s
         self.winner_menu = None
+        self.end_text = None # what the winner box says instead of who won, when the game ended without a result
         
         self.white_is_human = white_is_human
         self.black_is_human = black_is_human
+        self.engine_worker = EngineWorker(time_limit=ENGINE_TIME_LIMIT, hash_mb=ENGINE_HASH_MB, tablebases=TABLEBASES)
+        self.book = OpeningBook.open_if_exists(OPENING_BOOK)
+        self.tablebases = Tablebases.open_if_exists(TABLEBASES)
+        self.tablebase_result = None # (win/draw/loss for the side to move, plies to mate) once the ending is covered
+        # online the server says which side is human, until then the box waits for an opponent
+        self.online = OnlineClient(SERVER_HOST, SERVER_PORT, notify=self.wake) if online else None
+        self.waiting_box = WaitingBox() if online else None
         
-        self.give_up_button = Button((553, 409), (53, 56), 3, border_radius=2, img=FLAG_IMG)
-        self.undo_button = Button((553, 479), (53, 56), 3, border_radius=2, img=ARROW_IMG)
+        self.give_up_button = Button((553, 409), (53, 56), 3, border_radius=2, img=assets.image("white_flag.png"))
+        self.undo_button = Button((553, 479), (53, 56), 3, border_radius=2, img=assets.image("arrow.png"))
+        # what the screen shows, so render only draws what changed
+        self.background = None
+        self.background_flipped = False
+        self.drawn_looks = {}
+        self.drawn_overlay = None # (rect, look)
+        self.drawn_drag = None
 
     def render_coordinates(self, screen):
-        ranks = RANKS.copy() if self.flip_board else RANKS.copy()[::-1]
-        files = FILES.copy() if not self.flip_board else FILES.copy()[::-1]
+        ranks = [get_text(r, 'grey', size=25) for r in (RANK_NAMES if self.flip_board else RANK_NAMES[::-1])]
+        files = [get_text(f, 'grey', size=25) for f in (FILE_NAMES if not self.flip_board else FILE_NAMES[::-1])]
         for i, r in enumerate(ranks):
             x = self.board.x - 20
             y = self.board.y + i*SQUARE_SIZE + 25
@@ -184,94 +217,157 @@ class GameScene(Scene):
     def render_board(self, screen):
         screen.blit(self.board_img, (self.board.x, self.board.y))
 
-    def render_pieces(self, screen):
-        pieces = list(filter(lambda x: x != '.', reduce(lambda x, y: x + y, self.board.grid)))
-        pieces = sorted(pieces, key=lambda x: int(x == self.selected_piece))
-        for piece in pieces:
-            j, i = piece.pos
-            if self.flip_board:
-                j, i = flip_coordinates(j, i)
-            x = self.board.x + j*SQUARE_SIZE
-            y = self.board.y + i*SQUARE_SIZE
-            if self.selected_piece == piece and self.drag_piece:
-                mx, my = pygame.mouse.get_pos()
-                x = mx - SQUARE_SIZE // 2
-                y = my - SQUARE_SIZE // 2
-                x = min(self.board.x + 480 - SQUARE_SIZE, max(self.board.x, x))
-                y = min(self.board.y + 480 - SQUARE_SIZE, max(self.board.y, y))
-            piece.render(screen, x, y)
-
-    def render_move(self, screen, move):
-        c, r = move.to_square
-        if self.flip_board:
-            c, r = flip_coordinates(c, r)
-        x = c*SQUARE_SIZE  + self.board.x
-        y = r*SQUARE_SIZE + self.board.y
-        if move.capturing:
-            screen.blit(TARGET_SQUARE, (x, y))
-        else:
-            screen.blit(MOVE_IMAGE, (x, y))
+    def render_background(self, screen):
+        """ The layer that only changes when the board is flipped: background colour, coordinates and the board."""
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(COLORS["bg"])
+        self.render_coordinates(self.background)
+        self.render_board(self.background)
+        self.background_flipped = self.flip_board
+        screen.blit(self.background, (0, 0))
 
-    def render_board_moves(self, screen):
-        if self.selected_piece and self.drag_piece:
-            mx, my = pygame.mouse.get_pos()
-            x = (mx - self.board.x) - (mx - self.board.x)%SQUARE_SIZE + self.board.x
-            y = (my - self.board.y) - (my - self.board.y)%SQUARE_SIZE + self.board.y
-            x = min(self.board.x + 480 - SQUARE_SIZE, max(self.board.x, x))
-            y = min(self.board.y + 480 - SQUARE_SIZE, max(self.board.y, y))
-            pygame.draw.rect(screen, 'grey', (x, y, SQUARE_SIZE, SQUARE_SIZE), 3)
-        for move in self.board.legal_moves:
-            c, r = move.from_square
-            if self.selected_piece == self.board.grid[r][c]:
-                self.render_move(screen, move)
-
-    def highlight_last_move(self, screen):
-        if self.board.move_log == []: return
-        c1, r1 = self.board.move_log[-1].from_square
-        c2, r2 = self.board.move_log[-1].to_square
+    def square_rect(self, col, row) -> pygame.Rect:
         if self.flip_board:
-            c1, r1 = flip_coordinates(c1, r1)
-            c2, r2 = flip_coordinates(c2, r2)
-        x1, y1 = c1*SQUARE_SIZE + self.board.x, r1*SQUARE_SIZE + self.board.y
-        x2, y2 = c2*SQUARE_SIZE + self.board.x, r2*SQUARE_SIZE + self.board.y
-        screen.blit(HIHGLIGHT_SQUARE, (x1, y1))
-        screen.blit(HIHGLIGHT_SQUARE, (x2, y2))
-        
+            col, row = flip_coordinates(col, row)
+        return pygame.Rect(self.board.x + col*SQUARE_SIZE, self.board.y + row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
 
-    def render(self, screen):
-        screen.fill(COLORS["bg"])
-        self.render_coordinates(screen)
-        self.render_board(screen)
-        self.highlight_last_move(screen)
+    def drag_rect(self) -> pygame.Rect:
+        """ Where the dragged piece is drawn, following the mouse inside the board."""
+        mx, my = pygame.mouse.get_pos()
+        x = min(self.board.x + 480 - SQUARE_SIZE, max(self.board.x, mx - SQUARE_SIZE // 2))
+        y = min(self.board.y + 480 - SQUARE_SIZE, max(self.board.y, my - SQUARE_SIZE // 2))
+        return pygame.Rect(x, y, SQUARE_SIZE, SQUARE_SIZE)
+
+    def square_looks(self) -> dict:
+        """
+            What the squares that are not blank show: (piece symbol, highlighted, move marker image, drag outline)
+            by (col, row). Only the pieces on the board and the marked squares are looked at.
+        """
+        highlighted = set()
+        last_move = self.board.last_move
+        if last_move is not None:
+            highlighted.update((last_move.from_square, last_move.to_square))
+        markers = {}
+        dragged = outline = None
         if self.selected_piece:
-            c, r = self.selected_piece.pos
-            if self.flip_board:
-                c, r = flip_coordinates(c, r)
-            x = c*SQUARE_SIZE  + self.board.x
-            y = r*SQUARE_SIZE  + self.board.y
-            screen.blit(HIHGLIGHT_SQUARE, (x, y)) # highlight selected piece
-            self.render_board_moves(screen)
-        self.render_pieces(screen)
-        if self.is_promotion:
-            self.promotion_menu.render(screen)
-        self.give_up_button.render(screen)
-        self.undo_button.render(screen)
+            highlighted.add(self.selected_piece.pos)
+            for move in self.board.moves_from(*self.selected_piece.pos):
+                markers[move.to_square] = assets.image("target.png" if move.capturing else "move.png")
+            if self.drag_piece:
+                dragged = self.selected_piece.pos
+                mx, my = pygame.mouse.get_pos()
+                col = min(7, max(0, (mx - self.board.x) // SQUARE_SIZE))
+                row = min(7, max(0, (my - self.board.y) // SQUARE_SIZE))
+                outline = flip_coordinates(col, row) if self.flip_board else (col, row)
+        looks = {pos: (piece.piece_symbol, False, None, False)
+                 for pos, piece in self.board.piece_map.items() if pos != dragged}
+        for pos in highlighted.union(markers, [outline] if outline else []):
+            looks[pos] = (looks.get(pos, BLANK_SQUARE)[0], pos in highlighted, markers.get(pos), pos == outline)
+        return looks
+
+    def squares_under(self, rect) -> list:
+        """ (col, row) of the squares a screen rect overlaps."""
+        x, y = self.board.x, self.board.y
+        cols = range(max(0, (rect.left - x) // SQUARE_SIZE), min(7, (rect.right - 1 - x) // SQUARE_SIZE) + 1)
+        rows = range(max(0, (rect.top - y) // SQUARE_SIZE), min(7, (rect.bottom - 1 - y) // SQUARE_SIZE) + 1)
+        return [flip_coordinates(col, row) if self.flip_board else (col, row) for row in rows for col in cols]
+
+    def render_square(self, screen, pos, look) -> pygame.Rect:
+        rect = self.square_rect(*pos)
+        symbol, highlighted, marker, outline = look
+        screen.blit(self.background, rect, rect)
+        if highlighted:
+            screen.blit(assets.image("highlight_square.png"), rect)
+        if outline:
+            pygame.draw.rect(screen, 'grey', rect, 3)
+        if marker:
+            screen.blit(marker, rect)
+        if symbol != '.':
+            render_piece(screen, symbol, rect.x, rect.y)
+        return rect
+
+    def overlay(self):
+        """ (box drawn over the board, its rect, what it looks like) or None."""
+        if self.waiting_box:
+            menu = self.waiting_box
+            rect = menu.bg.get_rect(topleft=(menu.x, menu.y))
+            return menu, rect, ('waiting', menu.back_to_menu.state)
+        if self.is_promotion and self.promotion_menu:
+            menu = self.promotion_menu
+            return menu, menu.rect, ('promotion', tuple(menu.rect))
         if self.winner_menu:
-            self.winner_menu.render(screen)
+            menu = self.winner_menu
+            rect = menu.bg.get_rect(topleft=(menu.x, menu.y))
+            return menu, rect, ('winner', menu.text, menu.back_to_menu.state, menu.rematch.state)
+        return None
+
+    def render(self, screen):
+        """
+            Draws only what changed since the last frame: squares whose piece or marks changed, the dragged piece,
+            buttons and boxes. The background layer is cached. Returns the dirty rects, empty when idle.
+        """
+        dirty = []
+        if self.background is None or self.background_flipped != self.flip_board:
+            self.render_background(screen)
+            self.drawn_looks = {}
+            self.drawn_overlay = self.drawn_drag = None
+            for button in (self.give_up_button, self.undo_button):
+                button.redraw(screen, self.background, force=True)
+            dirty.append(screen.get_rect())
+
+        # squares under a box that closed or under the dragged piece of the last frame are drawn again
+        stale = []
+        overlay = self.overlay()
+        if self.drawn_overlay and (overlay is None or overlay[2] != self.drawn_overlay[1]):
+            stale.append(self.drawn_overlay[0])
+            screen.blit(self.background, self.drawn_overlay[0], self.drawn_overlay[0])
+            dirty.append(self.drawn_overlay[0])
+        if self.drawn_drag:
+            stale.append(self.drawn_drag)
+        looks = self.square_looks()
+        drawn = self.drawn_looks
+        redraw = {pos for pos in looks.keys() | drawn.keys()
+                  if looks.get(pos, BLANK_SQUARE) != drawn.get(pos, BLANK_SQUARE)}
+        for rect in stale:
+            redraw.update(self.squares_under(rect))
+        for pos in redraw:
+            dirty.append(self.render_square(screen, pos, looks.get(pos, BLANK_SQUARE)))
+        self.drawn_looks = looks
+
+        self.drawn_drag = None
+        if self.selected_piece and self.drag_piece:
+            rect = self.drag_rect()
+            render_piece(screen, self.selected_piece.piece_symbol, rect.x, rect.y)
+            self.drawn_drag = rect
+            dirty.append(rect)
+
+        for button in (self.give_up_button, self.undo_button):
+            rect = button.redraw(screen, self.background)
+            if rect:
+                dirty.append(rect)
+
+        if overlay:
+            box, rect, state = overlay
+            if not self.drawn_overlay or self.drawn_overlay[1] != state or rect.collidelist(dirty) != -1:
+                box.render(screen)
+                dirty.append(rect)
+            self.drawn_overlay = (rect, state)
+        else:
+            self.drawn_overlay = None
+        return dirty
 
 
     def make_move(self, from_square, to_square, promotion=None):
         if self.game_over:
             self.reset_state()
             return
-        play = False
-        for move in self.board.legal_moves:
-            if (move.to_square, move.from_square, move.promotion) == (to_square, from_square, promotion):
-                self.board.push(move)
-                play = True
-                break
+        move = self.board.find_move(from_square, to_square, promotion)
+        if move:
+            self.board.push(move)
+            if self.online:
+                self.online.send("move", move.uci())
         self.reset_state()
-        if play:
+        if move:
             self.play_sound(move)
         
 
@@ -295,7 +391,7 @@ class GameScene(Scene):
             if self.selected_piece and spot != self.selected_piece:
                 self.piece_move = [self.selected_piece.pos, (col_idx, row_idx)]
         if event.type == pygame.MOUSEBUTTONDOWN:
-            if self.selected_piece and self.selected_piece.img_rect.collidepoint((mx, my)):
+            if self.selected_piece and self.selected_piece.pos == (col_idx, row_idx):
                 self.drag_piece = True
             else:
                 self.drag_piece = False
@@ -304,29 +400,24 @@ class GameScene(Scene):
     
     def play_sound(self, move):
             if self.check:
-                CHECK_SOUND.play()
+                assets.sound("check.mp3").play()
             elif move.promotion:
-                PROMOTION_SOUND.play()
+                assets.sound("promotion.mp3").play()
             elif move.castling:
-                CASTLING_SOUND.play()
+                assets.sound("castling.mp3").play()
             elif move.capturing:
-                CAPTURING_SOUND.play()
+                assets.sound("capturing.mp3").play()
             else:
-                MOVE_SOUND.play()
+                assets.sound("move.mp3").play()
     
-    def handle_events(self):
-        mx, my = pygame.mouse.get_pos()
-        for event in pygame.event.get():
+    def handle_events(self, events):
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
                 
-            if self.white_is_human and self.board.white_to_move or \
-            self.black_is_human and not self.board.white_to_move:
-                self.board_mouse_event_handler(event, mx, my)
-            else:
-                if not self.white_is_human and self.board.white_to_move or not self.black_is_human and not self.board.white_to_move:
-                    pass
+            if self.human_to_move() and event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                self.board_mouse_event_handler(event, *event.pos)
             
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_c:
@@ -336,14 +427,138 @@ class GameScene(Scene):
                     # print(get_engine_move(fen=self.board.get_fen()))
                 if event.key == pygame.K_x:
                     self.flip_board = not self.flip_board   
+                if event.key == pygame.K_t:
+                    # the next piece theme is loaded the first time it is shown
+                    next_theme()
+                    self.background = None
 
             if self.is_promotion:
                 self.promotion_menu.handle_events(event)
 
+            if self.give_up_button.handle_event(event) and not self.waiting_box:
+                self.give_up()
+            if self.undo_button.handle_event(event) and not self.game_over and not self.online:
+                self.undo()
+
+            if self.waiting_box and self.waiting_box.back_to_menu.handle_event(event):
+                self.close()
+                self.manager.go_to(MainMenuScene())
+                return
+
+            if self.winner_menu:
+                if self.winner_menu.back_to_menu.handle_event(event):
+                    self.close()
+                    self.manager.go_to(MainMenuScene())
+                    return
+                if self.winner_menu.rematch.handle_event(event):
+                    self.close()
+                    if self.online:
+                        self.manager.go_to(GameScene(white_is_human=False, black_is_human=False, online=True))
+                    else:
+                        self.manager.go_to(GameScene(self.white_is_human, self.black_is_human))
+                    return
+
+    def frame_rate(self) -> int:
+        """ Full rate while a piece is dragged, a slower one while the computer thinks, otherwise only on events."""
+        if self.drag_piece:
+            return MAX_FPS
+        if not self.game_over and not self.human_to_move() and not self.online:
+            return POLL_FPS
+        return 0
+
+    def give_up(self):
+        """ The side to move resigns, online always the player, who may give up on the opponent's move too."""
+        if self.game_over:
+            return
+        self.game_over = True
+        if self.online:
+            self.online.send("resign")
+            self.winner = 'Black' if self.white_is_human else 'White'
+        else:
+            self.winner = 'White' if not self.board.white_to_move else 'Black'
+
+    def undo(self):
+        if self.board.last_move is not None:
+            self.engine_worker.cancel()
+            self.play_sound(self.board.last_move)
+            self.board.undo_last_move()
+            # against the computer take back its reply too, so the human is to move again
+            if not self.human_to_move():
+                self.board.undo_last_move()
+            self.reset_state()
+
+    def human_to_move(self) -> bool:
+        return self.white_is_human if self.board.white_to_move else self.black_is_human
+
+    def play_computer_move(self):
+        """
+            Plays a book move while the position is in the opening book, otherwise starts the engine in the
+            background and plays its move once it is found; never blocks the frame.
+        """
+        move = self.book.choose(self.board) if self.book and not self.engine_worker.busy else None
+        if move is None:
+            if not self.engine_worker.busy:
+                self.engine_worker.start(self.board)
+                return
+            result = self.engine_worker.poll()
+            if result is None:
+                return
+            move = self.board.get_move_from_uci(result.uci)
+        if self.board.is_legal(move):
+            self.board.push(move)
+            self.reset_state()
+            self.play_sound(move)
+
+    @staticmethod
+    def wake():
+        """ Called from the network thread for each server message, so the main loop does not sleep on it."""
+        pygame.event.post(pygame.event.Event(NETWORK_EVENT))
+
+    def play_online(self):
+        """
+            Handles what the server sent since the last frame: the start of the game, the opponent's moves and
+            its end. Messages are queued by the network thread, so this never waits.
+        """
+        message = self.online.poll()
+        while message:
+            command, args = message[0], message[1:]
+            if command == "start":
+                self.white_is_human = args[0] == "w"
+                self.black_is_human = not self.white_is_human
+                self.flip_board = not self.white_is_human
+                self.waiting_box = None
+            elif command == "move" and not self.game_over and not self.human_to_move():
+                move = self.board.get_move_from_uci(args[0])
+                if self.board.is_legal(move):
+                    self.board.push(move)
+                    self.reset_state()
+                    self.play_sound(move)
+            elif command == "end" and not self.game_over:
+                # mate and draws are seen on the board too, resignations and disconnections only come from here
+                self.game_over = True
+                self.winner = {RESULT_WHITE: "White", RESULT_BLACK: "Black"}.get(args[0])
+            elif command == "closed" and not self.game_over:
+                self.game_over = True
+                self.winner = None
+                self.end_text = "No server" if self.waiting_box else "Connection lost"
+                self.waiting_box = None
+            message = self.online.poll()
+
+    def close(self):
+        if self.online:
+            self.online.close()
+        self.engine_worker.shutdown()
+        if self.book:
+            self.book.close()
+        if self.tablebases:
+            self.tablebases.close()
+
     def reset_state(self):
         self.check = self.board.is_check()
         self.mate = self.board.is_mate()
         self.stalemate = self.board.is_stalemate()
+        self.draw_reason = self.board.draw_reason()
+        self.tablebase_result = self.tablebases.probe(self.board) if self.tablebases else None
         self.selected_piece = None
         self.is_promotion = False
         self.piece_move = []
@@ -351,6 +566,11 @@ class GameScene(Scene):
 
     def update(self):
         promotion_type = None
+
+        if self.online:
+            self.play_online()
+        elif not self.game_over and not self.human_to_move():
+            self.play_computer_move()
         
         # making move
         if len(self.piece_move) == 2:
@@ -368,26 +588,22 @@ class GameScene(Scene):
             if not self.is_promotion or promotion_type:
                 self.make_move(*self.piece_move, promotion = promotion_type)
 
-        if self.give_up_button.check_click():
-            self.game_over = True
-            self.winner = 'White' if not self.board.white_to_move else 'Black'
-        if self.undo_button.check_click() and not self.game_over:
-            if self.board.move_log != []:
-                    self.play_sound(self.board.move_log[-1])
-                    self.board.undo_last_move()
-                    self.reset_state()
-
         if self.mate:
             self.winner = 'White' if not self.board.white_to_move else 'Black'
             self.game_over = True
-        elif self.stalemate:
+        elif self.stalemate or self.draw_reason:
             self.winner = None
             self.game_over = True
-        if self.game_over:
-            self.winner_menu = WinnerBox(winner=self.winner)
-            
-        if self.winner_menu:
-            if self.winner_menu.back_to_menu.check_click():
-                self.manager.go_to(MainMenuScene())
-            if self.winner_menu.rematch.check_click():
-                self.manager.go_to(GameScene())
+        elif self.tablebase_result and not self.online:
+            # a tablebase draw ends the game, a lost ending only when the computer is the side that loses
+            wdl, _ = self.tablebase_result
+            loser_is_white = self.board.white_to_move == (wdl == LOSS)
+            if wdl == DRAW:
+                self.winner = None
+                self.game_over = True
+            elif not (self.white_is_human if loser_is_white else self.black_is_human):
+                self.winner = 'Black' if loser_is_white else 'White'
+                self.game_over = True
+        if self.game_over and not self.winner_menu:
+            self.engine_worker.cancel()
+            self.winner_menu = WinnerBox(winner=self.winner, text=self.end_text)
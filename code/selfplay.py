@@ -0,0 +1,151 @@
+"""
+    Headless self-play: plays games on Chess.Board across worker processes and streams them out as they finish.
+    python selfplay.py --games 100 --workers 8 --policy engine --nodes 2000 --format pgn --output games.pgn
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from Chess import Board, STANDARD_FEN, RESULT_WHITE, RESULT_BLACK, RESULT_DRAW, RESULT_UNFINISHED
+from engine import Engine
+from book import OpeningBook
+
+
+# per worker process, built lazily by the policies that need it
+_engine = None
+_book = None
+
+
+def random_policy(board: Board, rng: random.Random, options: dict):
+    return rng.choice(board.legal_moves)
+
+
+def engine_policy(board: Board, rng: random.Random, options: dict):
+    global _engine, _book
+    if _engine is None:
+        _engine = Engine(time_limit=options["time"], node_limit=options["nodes"], hash_mb=options["hash_mb"])
+        _book = OpeningBook.open_if_exists(options["book"])
+    # a few random plies at the start, otherwise every game would be the same
+    if len(board.undo_log) < options["random_plies"]:
+        return rng.choice(board.legal_moves)
+    move = _book.choose(board, rng) if _book else None
+    return move or _engine.search(board)
+
+
+POLICIES = {
+    "random": random_policy,
+    "engine": engine_policy,
+}
+
+
+def play_game(task: tuple) -> dict:
+    """ Plays one game and returns its moves and result; runs inside a worker process."""
+    index, seed, options = task
+    rng = random.Random(seed)
+    policy = POLICIES[options["policy"]]
+    board = Board(options["fen"])
+    uci_moves, san_moves = [], []
+    result, termination = RESULT_UNFINISHED, "max plies"
+    while len(uci_moves) < options["max_plies"]:
+        if not board.legal_moves:
+            if board.is_check():
+                result, termination = (RESULT_BLACK if board.white_to_move else RESULT_WHITE), "checkmate"
+            else:
+                result, termination = RESULT_DRAW, "stalemate"
+            break
+        reason = board.draw_reason()
+        if reason:
+            result, termination = RESULT_DRAW, reason
+            break
+        move = policy(board, rng, options)
+        san_moves.append(board.san(move))
+        uci_moves.append(move.uci())
+        board.push(move)
+    return {"index": index, "seed": seed, "fen": options["fen"], "uci": uci_moves, "san": san_moves,
+            "result": result, "termination": termination, "policy": options["policy"]}
+
+
+def format_pgn(game: dict) -> str:
+    headers = [("Event", "Self-play"), ("Round", str(game["index"] + 1)), ("White", game["policy"]),
+               ("Black", game["policy"]), ("Result", game["result"]), ("Termination", game["termination"])]
+    if game["fen"] != STANDARD_FEN:
+        headers += [("SetUp", "1"), ("FEN", game["fen"])]
+    board = Board(game["fen"])
+    number, white_to_move = board.full_moves or 1, board.white_to_move
+    tokens = []
+    for i, san in enumerate(game["san"]):
+        if white_to_move:
+            tokens.append(f"{number}.")
+        elif i == 0:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+        if not white_to_move:
+            number += 1
+        white_to_move = not white_to_move
+    tokens.append(game["result"])
+    lines, line = [], ""
+    for token in tokens:
+        if len(line) + len(token) + 1 > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "".join(f'[{name} "{value}"]\n' for name, value in headers) + "\n" + "\n".join(lines) + "\n\n"
+
+
+def format_uci(game: dict) -> str:
+    return f"{game['result']} {' '.join(game['uci'])}\n"
+
+
+def run(games: int, workers: int, options: dict, out=sys.stdout, fmt: str = "pgn", seed: int = 0, log=sys.stderr) -> dict:
+    """ Plays the games on a process pool, writing each one as soon as it finishes. Returns result counts."""
+    formatter = format_pgn if fmt == "pgn" else format_uci
+    tasks = [(i, seed + i, options) for i in range(games)]
+    results = {RESULT_WHITE: 0, RESULT_BLACK: 0, RESULT_DRAW: 0, RESULT_UNFINISHED: 0}
+    plies = 0
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for done, game in enumerate(pool.imap_unordered(play_game, tasks), 1):
+            out.write(formatter(game))
+            out.flush()
+            results[game["result"]] += 1
+            plies += len(game["uci"])
+            if log and (done % max(1, games // 20) == 0 or done == games):
+                elapsed = time.perf_counter() - start
+                log.write(f"{done}/{games} games  {done / elapsed:.2f} games/s  {plies / elapsed:.0f} plies/s\n")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless self-play")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--policy", choices=POLICIES, default="random")
+    parser.add_argument("--fen", default=STANDARD_FEN)
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--nodes", type=int, default=2000, help="engine node budget per move")
+    parser.add_argument("--time", type=float, default=10.0, help="engine time budget per move, seconds")
+    parser.add_argument("--hash-mb", type=float, default=4, help="engine transposition table per worker")
+    parser.add_argument("--random-plies", type=int, default=4, help="random opening plies for the engine policy")
+    parser.add_argument("--book", help="opening book (book.py) the engine policy plays from while it has moves")
+    parser.add_argument("--format", choices=("pgn", "uci"), default="pgn")
+    parser.add_argument("--output", help="file to write the games to, stdout by default")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    options = {"policy": args.policy, "fen": args.fen, "max_plies": args.max_plies, "nodes": args.nodes,
+               "time": args.time, "hash_mb": args.hash_mb, "random_plies": args.random_plies, "book": args.book}
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        results = run(args.games, args.workers, options, out, args.format, args.seed)
+    finally:
+        if args.output:
+            out.close()
+    print(" ".join(f"{result}: {count}" for result, count in results.items()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+    Game server for online two-player games: one asyncio process pairs players as they come and hosts all their
+    games on Chess.Board, checking every move before passing it on.
+    python server.py --host localhost --port 8765
+
+    Messages are single lines of ASCII words, moves in uci.
+    client -> server:  play | move e2e4 | resign
+    server -> client:  start w|b <game id> | move e7e5 | end 1-0|0-1|1/2-1/2 <reason> | error <text>
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+from Chess import Board, RESULT_WHITE, RESULT_BLACK, RESULT_DRAW, uci_key
+
+
+MAX_LINE = 64 # longer lines are not messages of this protocol
+
+
+class Player:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.game = None
+        self.is_white = None
+
+    def send(self, *words) -> None:
+        if not self.writer.is_closing():
+            self.writer.write((" ".join(words) + "\n").encode())
+
+
+class Game:
+    def __init__(self, game_id: int, white: Player, black: Player):
+        self.id = game_id
+        self.board = Board()
+        self.white = white
+        self.black = black
+        white.game, white.is_white = self, True
+        black.game, black.is_white = self, False
+
+    def opponent(self, player: Player) -> Player:
+        return self.black if player is self.white else self.white
+
+    def result(self) -> tuple:
+        """ (result, reason) once the game is over on the board, None while it goes on."""
+        board = self.board
+        if board.is_mate():
+            return (RESULT_BLACK if board.white_to_move else RESULT_WHITE), "checkmate"
+        reason = board.draw_reason()
+        if reason:
+            return RESULT_DRAW, reason
+        return None
+
+
+class GameServer:
+    def __init__(self):
+        self.waiting = None # the player waiting for an opponent
+        self.games = {}
+        self._ids = itertools.count(1)
+
+    async def serve(self, host: str = "localhost", port: int = 8765) -> None:
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Reads the messages of one connection until it closes."""
+        player = Player(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode("ascii", "replace").split()
+                if words:
+                    self.dispatch(player, words)
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # a reset connection, or a line over MAX_LINE
+            pass
+        finally:
+            self.drop(player)
+            writer.close()
+
+    def dispatch(self, player: Player, words: list) -> None:
+        command, args = words[0], words[1:]
+        if command == "play":
+            self.play(player)
+        elif command == "move" and len(args) == 1:
+            self.move(player, args[0])
+        elif command == "resign" and player.game:
+            game = player.game
+            self.end(game, RESULT_BLACK if player.is_white else RESULT_WHITE, "resignation")
+        else:
+            player.send("error", "unexpected", command)
+
+    def play(self, player: Player) -> None:
+        """ Pairs the player with the one waiting, or makes it the one waiting. Whoever waited plays white."""
+        if player.game or player is self.waiting:
+            player.send("error", "already playing")
+            return
+        if self.waiting is None:
+            self.waiting = player
+            return
+        game = Game(next(self._ids), self.waiting, player)
+        self.waiting = None
+        self.games[game.id] = game
+        game.white.send("start", "w", str(game.id))
+        game.black.send("start", "b", str(game.id))
+
+    def move(self, player: Player, uci: str) -> None:
+        game = player.game
+        if game is None:
+            player.send("error", "not playing")
+            return
+        board = game.board
+        if board.white_to_move != player.is_white:
+            player.send("error", "not your move")
+            return
+        packed = board.legal_index.get(uci_key(uci))
+        if packed is None:
+            player.send("error", "illegal", uci)
+            return
+        board.make(packed)
+        game.opponent(player).send("move", uci)
+        over = game.result()
+        if over:
+            self.end(game, *over)
+
+    def end(self, game: Game, result: str, reason: str) -> None:
+        reason = reason.replace(" ", "-")
+        for player in (game.white, game.black):
+            player.send("end", result, reason)
+            player.game = None
+        del self.games[game.id]
+
+    def drop(self, player: Player) -> None:
+        """ A closed connection: its game is lost, or it stops waiting."""
+        if self.waiting is player:
+            self.waiting = None
+        game = player.game
+        if game:
+            self.end(game, RESULT_BLACK if player.is_white else RESULT_WHITE, "disconnect")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online two-player game server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    print(f"serving on {args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(GameServer().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+    Endgame tablebases for positions with up to four pieces, generated here by retrograde analysis.
+
+    A table holds one byte per position of a material signature such as KQvK: 0 for a draw, 255 for a position
+    that cannot occur, otherwise distance to mate in plies + 1, odd for the side to move losing and even for it
+    winning. Tables are stored for the stronger side as white; the other colour is probed by mirroring the board.
+    The white king is folded onto a1-d1-d4 (a-d files with pawns), the other pieces follow in signature order:
+    index = ((king slot * 64 + square) * 64 + ...) * 2 + black to move. Castling is never possible in a table
+    and en passant is ignored while generating, positions with an en passant capture on the board are not probed.
+    python tablebase.py generate KQvK KRvK KPvK
+    python tablebase.py probe --fen "8/8/8/4k3/8/8/3QK3/8 w - - 0 1"
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from itertools import product
+from Chess import Board, Move, STANDARD_FEN, SYMBOL_CODES, BLACK, KING, PAWN, MOVE_CAPTURE, \
+    MOVE_EN_PASSANT
+from bitboard import scan_forward
+from config import TABLEBASES
+
+
+TABLE_MAGIC = b"CHST"
+VERSION = 1
+MAX_PIECES = 4
+INVALID = 255
+WIN, DRAW, LOSS = 1, 0, -1
+
+_HEADER = struct.Struct("<4sII")
+
+PIECE_ORDER = "KQRBNP"
+_PIECE_VALUES = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+# a lone king or a king and a minor piece against a lone king cannot mate, there is no table for them
+DRAWN = {"KvK", "KBvK", "KNvK", "KvKB", "KvKN"}
+
+
+def _mirror(sq: int) -> int:
+    return sq ^ 56
+
+
+def _transpose(sq: int) -> int:
+    """ Reflection in the a1-h8 diagonal."""
+    return (7 - (sq & 7)) * 8 + 7 - (sq >> 3)
+
+
+def _transforms(pawns: bool) -> list:
+    """ For every square of the white king the square mapping that moves it into the king slots."""
+    transforms = []
+    for king in range(64):
+        mapping = list(range(64))
+        col, rank = king & 7, 7 - (king >> 3)
+        if col > 3:
+            mapping = [sq ^ 7 for sq in mapping]
+            col = 7 - col
+        if not pawns:
+            if rank > 3:
+                mapping = [_mirror(sq) for sq in mapping]
+                rank = 7 - rank
+            if rank > col:
+                mapping = [_transpose(sq) for sq in mapping]
+        transforms.append(mapping)
+    return transforms
+
+
+_TRANSFORMS = {pawns: _transforms(pawns) for pawns in (False, True)}
+# squares the white king is folded onto: a1-d1-d4 without pawns, files a-d with pawns
+_KING_SLOTS = {pawns: [sq for sq in range(64) if _TRANSFORMS[pawns][sq][sq] == sq] for pawns in (False, True)}
+
+
+def material(board: Board) -> tuple:
+    """ ("KQ", "K") style piece letters of white and black."""
+    pieces = board.pieces
+    white = "".join(symbol * bin(pieces[SYMBOL_CODES[symbol]]).count("1") for symbol in PIECE_ORDER)
+    black = "".join(symbol * bin(pieces[SYMBOL_CODES[symbol.lower()]]).count("1") for symbol in PIECE_ORDER)
+    return white, black
+
+
+def table_name(white: str, black: str) -> tuple:
+    """ (name of the table, True if the colours are swapped in it) for the material of a position."""
+    if (sum(_PIECE_VALUES[p] for p in black), black) > (sum(_PIECE_VALUES[p] for p in white), white):
+        return f"{black}v{white}", True
+    return f"{white}v{black}", False
+
+
+def decode(value: int) -> tuple:
+    """ (win/draw/loss for the side to move, plies to mate) of a table byte."""
+    if value == 0:
+        return DRAW, 0
+    return (LOSS if value & 1 else WIN), value - 1
+
+
+class Table:
+    def __init__(self, name: str, data=None):
+        self.name = name
+        white, black = name.split("v")
+        if not white.startswith("K") or not black.startswith("K") or len(white) + len(black) > MAX_PIECES \
+        or any(p not in PIECE_ORDER for p in white[1:] + black[1:]) or "K" in white[1:] + black[1:]:
+            raise Exception(f"Invalid table name {name}")
+        self.codes = [SYMBOL_CODES[p] for p in white] + [SYMBOL_CODES[p.lower()] for p in black]
+        self.pawns = "P" in name
+        self.slots = _KING_SLOTS[self.pawns]
+        self.slot_of = {sq: slot for slot, sq in enumerate(self.slots)}
+        self.transforms = _TRANSFORMS[self.pawns]
+        self.size = len(self.slots) * 64 ** (len(self.codes) - 1) * 2
+        # the pieces after the white king grouped by code, identical pieces are indexed in square order
+        self.groups = []
+        for code in self.codes[1:]:
+            if self.groups and self.groups[-1][0] == code:
+                self.groups[-1][1] += 1
+            else:
+                self.groups.append([code, 1])
+        self.data = data
+
+    def index(self, board: Board, flip: bool = False) -> int:
+        """ Position of the board in the table, flip for a board with the colours the other way round."""
+        pieces = board.pieces
+        mirror = 56 if flip else 0
+        side = BLACK if flip else 0
+        king = pieces[KING ^ side].bit_length() - 1 ^ mirror
+        transform = self.transforms[king]
+        index = self.slot_of[transform[king]]
+        for code, _ in self.groups:
+            for sq in sorted(transform[sq ^ mirror] for sq in scan_forward(pieces[code ^ side])):
+                index = index * 64 + sq
+        return index * 2 + (board.white_to_move == flip)
+
+    def positions(self):
+        """ Yields (index, piece codes of the 64 squares, white to move) of every placement the index can hold."""
+        count = len(self.codes)
+        index = 0
+        for king, *others in product(self.slots, *([range(64)] * (count - 1))):
+            squares = [0] * 64
+            squares[king] = self.codes[0]
+            valid = True
+            for i, sq in enumerate(others, 1):
+                code = self.codes[i]
+                if squares[sq] or code & 7 == PAWN and sq >> 3 in (0, 7) \
+                or code == self.codes[i - 1] and sq < others[i - 2]:
+                    valid = False
+                    break
+                squares[sq] = code
+            if valid:
+                yield index, squares, True
+                yield index + 1, squares, False
+            index += 2
+
+
+class Tablebases:
+    """ The tables of a directory, mapped on first use."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tables = {}
+        self.max_pieces = MAX_PIECES
+
+    @classmethod
+    def open_if_exists(cls, directory: str):
+        """ Tablebases of the directory, None if it holds no tables."""
+        if directory and os.path.isdir(directory) and any(name.endswith(".tb") for name in os.listdir(directory)):
+            return cls(directory)
+        return None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.tb")
+
+    def table(self, name: str) -> Table:
+        if name not in self.tables:
+            path = self.path(name)
+            table = None
+            if os.path.exists(path):
+                table = Table(name)
+                with open(path, "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, size = _HEADER.unpack_from(data, 0)
+                if magic != TABLE_MAGIC or version != VERSION or size != table.size:
+                    data.close()
+                    raise Exception(f"{path} is not a version {VERSION} {name} table")
+                table.data = data
+            self.tables[name] = table
+        return self.tables[name]
+
+    def probe(self, board: Board) -> tuple:
+        """
+            (WIN/DRAW/LOSS for the side to move, plies to mate) of the position, None if it is not covered: too
+            many pieces, castling rights, an en passant capture on the board or no table for the material.
+        """
+        if board.castling_rights or bin(board.occupied).count("1") > self.max_pieces:
+            return None
+        if board.en_passant_target and any(move & MOVE_EN_PASSANT for move in board.packed_legal_moves):
+            return None
+        white, black = material(board)
+        name, flip = table_name(white, black)
+        if name in DRAWN:
+            return DRAW, 0
+        table = self.table(name)
+        if table is None:
+            return None
+        value = table.data[_HEADER.size + table.index(board, flip)]
+        return None if value == INVALID else decode(value)
+
+    def best_move(self, board: Board) -> int:
+        """ Packed move keeping the best result: the fastest win, a draw, or the longest resistance."""
+        best, best_rank = None, None
+        for move in board.packed_legal_moves:
+            board.make(move)
+            result = self.probe(board)
+            board.unmake()
+            if result is None:
+                return None
+            wdl, dtm = result
+            # the opponent's loss is our win; shorter wins and longer losses rank higher
+            rank = (-wdl, -dtm if wdl == LOSS else dtm if wdl == WIN else 0)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def close(self) -> None:
+        for table in self.tables.values():
+            if table is not None:
+                table.data.close()
+        self.tables = {}
+
+
+def subtables(name: str) -> list:
+    """ Names of the tables a capture or promotion leads to from this one."""
+    white, black = name.split("v")
+    names = set()
+    for i in range(1, len(white)):
+        names.add(table_name(white[:i] + white[i + 1:], black)[0])
+        if white[i] == "P":
+            for promotion in "QRBN":
+                names.add(table_name("".join(sorted(white[:i] + promotion + white[i + 1:], key=PIECE_ORDER.index)), black)[0])
+    for i in range(1, len(black)):
+        names.add(table_name(white, black[:i] + black[i + 1:])[0])
+        if black[i] == "P":
+            for promotion in "QRBN":
+                names.add(table_name(white, "".join(sorted(black[:i] + promotion + black[i + 1:], key=PIECE_ORDER.index)))[0])
+    return sorted(names - DRAWN)
+
+
+def generate(name: str, tablebases: Tablebases, log=sys.stderr) -> None:
+    """
+        Generates a table into the directory of tablebases; the tables it converts into by a capture or a
+        promotion are generated first if missing. Every position is expanded once, then results spread back
+        from the mates in order of distance.
+    """
+    for sub in subtables(name):
+        if tablebases.table(sub) is None:
+            generate(sub, tablebases, log)
+    table = Table(name)
+    start = time.perf_counter()
+    values = bytearray([INVALID]) * table.size
+    offsets = array('I', [0]) * (table.size + 1)
+    children = array('I')
+    # moves of a position not yet known to lose (draws never do); at zero every move loses
+    remaining = array('H', [0]) * table.size
+    # results that come from other tables: distance -> [(position, result of the child for its side to move)]
+    outside = {}
+    mates = []
+    board = Board(None)
+    filled = 0
+    for index, squares, white_to_move in table.positions():
+        while filled <= index:
+            offsets[filled] = len(children)
+            filled += 1
+        try:
+            board.set_squares(squares, white_to_move)
+        except Exception:
+            continue # the side not to move is in check
+        values[index] = 0
+        moves = board.packed_legal_moves
+        remaining[index] = len(moves)
+        if not moves and board.is_check():
+            mates.append(index)
+        for move in moves:
+            board.make(move)
+            if move & MOVE_CAPTURE or move >> 12 & 7:
+                result = tablebases.probe(board)
+                if result is None:
+                    raise Exception(f"Missing table for {'v'.join(material(board))}")
+                wdl, dtm = result
+                if wdl != DRAW:
+                    outside.setdefault(dtm, []).append((index, wdl))
+            else:
+                children.append(table.index(board))
+            board.unmake()
+    while filled <= table.size:
+        offsets[filled] = len(children)
+        filled += 1
+
+    # parents of every position, as a flat array the same way
+    counts = array('I', [0]) * (table.size + 1)
+    for child in children:
+        counts[child + 1] += 1
+    for i in range(table.size):
+        counts[i + 1] += counts[i]
+    parent_offsets = array('I', counts)
+    parents = array('I', [0]) * len(children)
+    fill = array('I', counts)
+    for index in range(table.size):
+        for i in range(offsets[index], offsets[index + 1]):
+            child = children[i]
+            parents[fill[child]] = index
+            fill[child] += 1
+    del children, fill, counts, offsets
+
+    levels = {0: mates}
+    for index in mates:
+        values[index] = 1
+    dtm = 0
+    last_outside = max(outside, default=0)
+    while levels.get(dtm) or dtm <= last_outside:
+        found = levels.setdefault(dtm + 1, [])
+        for index, wdl in outside.get(dtm, ()):
+            if values[index]:
+                continue
+            if wdl == LOSS:
+                values[index] = dtm + 2
+                found.append(index)
+            else:
+                remaining[index] -= 1
+                if remaining[index] == 0:
+                    values[index] = dtm + 2
+                    found.append(index)
+        for child in levels.get(dtm, ()):
+            child_loses = values[child] & 1
+            for i in range(parent_offsets[child], parent_offsets[child + 1]):
+                index = parents[i]
+                if values[index]:
+                    continue
+                if child_loses:
+                    values[index] = dtm + 2
+                    found.append(index)
+                else:
+                    remaining[index] -= 1
+                    if remaining[index] == 0:
+                        values[index] = dtm + 2
+                        found.append(index)
+        dtm += 1
+        if dtm > INVALID - 3:
+            raise Exception(f"{name}: mates longer than {INVALID - 3} plies do not fit in a byte")
+
+    path = tablebases.path(name)
+    os.makedirs(tablebases.directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(_HEADER.pack(TABLE_MAGIC, VERSION, table.size))
+        f.write(values)
+    os.replace(path + ".tmp", path)
+    tablebases.tables.pop(name, None)
+    if log:
+        wins = sum(1 for v in values if v != INVALID and v and not v & 1)
+        longest = max((v for v in values if v != INVALID), default=1) - 1
+        print(f"{name}: {table.size} positions, {wins} won for the side to move, longest mate {longest} plies, "
+              f"{time.perf_counter() - start:.1f}s", file=log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endgame tablebases")
+    parser.add_argument("--dir", default=TABLEBASES)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("generate", help="generate tables, with the ones they depend on")
+    build.add_argument("names", nargs="*", default=["KQvK", "KRvK", "KPvK"])
+    probe = commands.add_parser("probe", help="result and best move of a position")
+    probe.add_argument("--fen", default=STANDARD_FEN)
+    args = parser.parse_args()
+
+    tablebases = Tablebases(args.dir)
+    if args.command == "generate":
+        for name in args.names:
+            generate(name, tablebases)
+        return
+    board = Board(args.fen)
+    result = tablebases.probe(board)
+    if result is None:
+        print("not in the tablebases")
+        return
+    wdl, dtm = result
+    move = tablebases.best_move(board)
+    print({WIN: "win", DRAW: "draw", LOSS: "loss"}[wdl] + (f" in {dtm} plies" if wdl else ""),
+          Move.from_packed(move).uci() if move else "")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+    Round trips through binformat position and game files.
+    python -m pytest test_binformat.py
+"""
+import os
+import random
+import pytest
+from Chess import Board, RESULTS
+from binformat import HEADER_SIZE, RECORD_SIZE, PositionWriter, PositionFile, GameWriter, GameFile
+
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 57 120",
+    "4k3/8/8/8/8/8/8/4K2R b K - 99 300",
+]
+
+
+def random_games(count: int, seed: int = 0) -> list:
+    """ (uci moves, result) of random games, some long enough to castle, capture en passant and promote."""
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        board = Board()
+        moves = []
+        for _ in range(rng.randint(0, 200)):
+            if not board.legal_moves:
+                break
+            move = rng.choice(board.legal_moves)
+            moves.append(move.uci())
+            board.push(move)
+        games.append((moves, rng.choice(RESULTS)))
+    return games
+
+
+def test_header_keeps_records_aligned(tmp_path):
+    path = str(tmp_path / "positions.bin")
+    with PositionWriter(path) as writer:
+        for fen in FENS:
+            writer.add(Board(fen))
+    assert HEADER_SIZE == 16
+    assert os.path.getsize(path) == HEADER_SIZE + len(FENS) * RECORD_SIZE
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_position_round_trip(tmp_path, fen):
+    path = str(tmp_path / "positions.bin")
+    board = Board(fen)
+    with PositionWriter(path) as writer:
+        writer.add(board)
+    with PositionFile(path) as positions:
+        read = positions.board(0)
+    assert read.get_fen() == board.get_fen()
+    assert read.zobrist == board.zobrist
+
+
+def test_positions_of_played_games_round_trip(tmp_path):
+    path = str(tmp_path / "positions.bin")
+    expected = []
+    with PositionWriter(path) as writer:
+        for moves, _ in random_games(20):
+            board = Board()
+            for uci in moves:
+                board.push(board.get_move_from_uci(uci))
+                writer.add(board)
+                expected.append((board.get_fen(), board.zobrist))
+    with PositionFile(path) as positions:
+        assert len(positions) == len(expected)
+        for i, (fen, zobrist) in enumerate(expected):
+            read = positions.board(i)
+            assert (read.get_fen(), read.zobrist) == (fen, zobrist)
+
+
+def test_game_round_trip(tmp_path):
+    path = str(tmp_path / "games.bin")
+    games = random_games(20, seed=1)
+    finals = []
+    with GameWriter(path) as writer:
+        for moves, result in games:
+            board = Board()
+            packed = []
+            for uci in moves:
+                move = board.get_move_from_uci(uci)
+                packed.append(move.packed)
+                board.push(move)
+            writer.add(Board(), packed, result)
+            finals.append((board.get_fen(), board.zobrist))
+    with GameFile(path) as game_file:
+        assert len(game_file) == len(games)
+        for game, (moves, result), final in zip(game_file, games, finals):
+            assert game.result == result
+            assert game.uci() == moves
+            board = game.board()
+            board.make_uci(moves)
+            assert (board.get_fen(), board.zobrist) == final
+        # games are views into the map, which only closes once none is left
+        del game
+
+
+def test_game_from_a_fen(tmp_path):
+    path = str(tmp_path / "games.bin")
+    start = Board(FENS[2])
+    with GameWriter(path) as writer:
+        writer.add(start, [start.get_move_from_uci("e5f6").packed], "1-0")
+    with GameFile(path) as game_file:
+        game = game_file[0]
+        assert game.board().get_fen() == start.get_fen()
+        assert game.board().zobrist == start.zobrist
+        assert game.uci() == ["e5f6"]
+        del game
+
+
+def test_old_header_is_refused(tmp_path):
+    path = str(tmp_path / "old.bin")
+    with open(path, "wb") as f:
+        # the 12 byte header of version 1 followed by a record
+        f.write(b"CHSP" + (1).to_bytes(4, "little") + RECORD_SIZE.to_bytes(4, "little") + bytes(RECORD_SIZE))
+    with pytest.raises(Exception, match="not a version 2"):
+        PositionFile(path)
@@ -0,0 +1,93 @@
+"""
+    Draw rules of Board: the halfmove clock, repetition, insufficient material and stalemate.
+    python -m pytest test_draws.py
+"""
+import pytest
+from Chess import Board, STANDARD_FEN
+
+
+def play(board: Board, moves: str) -> Board:
+    board.make_uci(moves.split())
+    return board
+
+
+def test_halfmove_clock_counts_quiet_moves():
+    board = play(Board(STANDARD_FEN), "g1f3 g8f6 b1c3")
+    assert board.half_moves == 3
+
+
+def test_pawn_move_resets_halfmove_clock():
+    board = play(Board(STANDARD_FEN), "g1f3 g8f6 e2e4")
+    assert board.half_moves == 0
+
+
+def test_capture_resets_halfmove_clock():
+    board = play(Board("r3k3/8/8/8/8/8/8/R3K3 w - - 40 60"), "e1d1 e8d8 a1a8")
+    assert board.half_moves == 0
+
+
+def test_fifty_moves():
+    board = Board("4k3/8/8/8/8/8/8/R3K3 w - - 99 80")
+    assert not board.is_fifty_moves()
+    play(board, "a1a2")
+    assert board.is_fifty_moves()
+    assert board.draw_reason() == "fifty moves"
+
+
+def test_mate_on_the_hundredth_ply_is_not_a_draw():
+    board = Board("7k/6Q1/6K1/8/8/8/8/8 b - - 100 80")
+    assert board.is_mate()
+    assert board.draw_reason() is None
+
+
+def test_threefold_repetition():
+    board = Board(STANDARD_FEN)
+    play(board, "g1f3 g8f6 f3g1 f6g8")
+    assert board.repetitions() == 1
+    assert board.is_repetition(2)
+    assert not board.is_repetition()
+    play(board, "g1f3 g8f6 f3g1 f6g8")
+    assert board.repetitions() == 2
+    assert board.is_repetition()
+    assert board.draw_reason() == "threefold repetition"
+
+
+def test_irreversible_move_ends_repetition():
+    # the knights dance back, but a pawn moved in between, so the positions are not the same
+    board = play(Board(STANDARD_FEN), "g1f3 g8f6 f3g1 f6g8 e2e3 e7e6 g1f3 g8f6 f3g1 f6g8")
+    assert board.repetitions() == 1
+    assert board.draw_reason() is None
+
+
+def test_same_placement_other_side_to_move_is_no_repetition():
+    # the rook goes round a triangle and the king back and forth, so white is to move no more
+    board = play(Board("4k3/8/8/8/8/8/8/R3K3 w - - 0 1"), "a1a2 e8d8 a2a3 d8e8 a3a1")
+    assert board.get_fen().split()[0] == "4k3/8/8/8/8/8/8/R3K3"
+    assert board.repetitions() == 0
+
+
+@pytest.mark.parametrize("fen, insufficient", [
+    ("4k3/8/8/8/8/8/8/4K3 w - - 0 1", True),     # KvK
+    ("4k3/8/8/8/8/8/8/2B1K3 w - - 0 1", True),   # KBvK
+    ("4k3/8/8/8/8/8/8/1N2K3 b - - 0 1", True),   # KNvK
+    ("4k3/8/8/8/8/8/8/2B1K1b1 w - - 0 1", True),  # bishops on squares of one colour
+    ("4k3/8/8/8/8/8/8/2B1Kb2 w - - 0 1", False),  # bishops on both colours
+    ("4k3/8/8/8/8/8/8/1N2K1N1 w - - 0 1", False), # two knights
+    ("4k3/8/8/8/8/8/8/1N2K1b1 w - - 0 1", False), # knight and bishop
+    ("4k3/8/8/8/8/8/4P3/4K3 w - - 0 1", False),   # a pawn
+    ("4k3/8/8/8/8/8/8/R3K3 w - - 0 1", False),    # a rook
+])
+def test_insufficient_material(fen, insufficient):
+    board = Board(fen)
+    assert board.is_insufficient_material() == insufficient
+    assert (board.draw_reason() == "insufficient material") == insufficient
+
+
+def test_stalemate():
+    board = Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    assert board.is_stalemate()
+    assert board.draw_reason() == "stalemate"
+
+
+def test_start_position_is_no_draw():
+    assert Board(STANDARD_FEN).draw_reason() is None
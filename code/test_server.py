@@ -0,0 +1,115 @@
+"""
+    The server.py protocol, played over localhost with two clients.
+    python -m pytest test_server.py
+"""
+import asyncio
+import time
+from server import GameServer
+from online import OnlineClient
+
+
+TIMEOUT = 5
+
+
+async def read(reader: asyncio.StreamReader) -> list:
+    line = await asyncio.wait_for(reader.readline(), TIMEOUT)
+    return line.decode().split()
+
+
+def send(writer: asyncio.StreamWriter, line: str) -> None:
+    writer.write((line + "\n").encode())
+
+
+async def start_server(game_server: GameServer):
+    server = await asyncio.start_server(game_server.handle, "localhost", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def start_game(game_server: GameServer, port: int) -> tuple:
+    """ Two connected players, (reader, writer) of white then of black, with their start messages read."""
+    white = await asyncio.open_connection("localhost", port)
+    send(white[1], "play")
+    # whoever waited first plays white
+    while game_server.waiting is None:
+        await asyncio.sleep(0.001)
+    black = await asyncio.open_connection("localhost", port)
+    send(black[1], "play")
+    assert (await read(white[0]))[:2] == ["start", "w"]
+    assert (await read(black[0]))[:2] == ["start", "b"]
+    return white, black
+
+
+def run(scenario) -> None:
+    async def main():
+        game_server = GameServer()
+        server, port = await start_server(game_server)
+        async with server:
+            await scenario(game_server, port)
+    asyncio.run(main())
+
+
+def test_scripted_game_to_mate():
+    async def scenario(game_server, port):
+        (white_in, white_out), (black_in, black_out) = await start_game(game_server, port)
+        assert len(game_server.games) == 1
+        for i, uci in enumerate(["f2f3", "e7e5", "g2g4", "d8h4"]):
+            mover, opponent = (white_out, black_in) if i % 2 == 0 else (black_out, white_in)
+            send(mover, f"move {uci}")
+            assert await read(opponent) == ["move", uci]
+        assert await read(white_in) == ["end", "0-1", "checkmate"]
+        assert await read(black_in) == ["end", "0-1", "checkmate"]
+        assert not game_server.games
+        white_out.close()
+        black_out.close()
+    run(scenario)
+
+
+def test_moves_are_validated():
+    async def scenario(game_server, port):
+        (white_in, white_out), (black_in, black_out) = await start_game(game_server, port)
+        send(black_out, "move e7e5")
+        assert await read(black_in) == ["error", "not", "your", "move"]
+        send(white_out, "move e2e5")
+        assert await read(white_in) == ["error", "illegal", "e2e5"]
+        send(white_out, "castle")
+        assert await read(white_in) == ["error", "unexpected", "castle"]
+        send(white_out, "move e2e4")
+        assert await read(black_in) == ["move", "e2e4"]
+        assert game_server.games[1].board.get_fen().split()[0] == "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR"
+        white_out.close()
+        black_out.close()
+    run(scenario)
+
+
+def test_resignation_and_disconnect():
+    async def scenario(game_server, port):
+        (white_in, white_out), (black_in, black_out) = await start_game(game_server, port)
+        send(white_out, "resign")
+        assert await read(white_in) == ["end", "0-1", "resignation"]
+        assert await read(black_in) == ["end", "0-1", "resignation"]
+        white_out.close()
+        black_out.close()
+
+        (white_in, white_out), (black_in, black_out) = await start_game(game_server, port)
+        black_out.close()
+        assert await read(white_in) == ["end", "1-0", "disconnect"]
+        assert not game_server.games
+        white_out.close()
+    run(scenario)
+
+
+def test_online_client_closes_its_loop():
+    async def scenario(game_server, port):
+        clients = [OnlineClient("localhost", port), OnlineClient("localhost", port)]
+        messages = [None, None]
+        deadline = time.monotonic() + TIMEOUT
+        while None in messages and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+            messages = [message or client.poll() for message, client in zip(messages, clients)]
+        assert sorted(message[1] for message in messages) == ["b", "w"]
+        for client in clients:
+            client.close()
+        while any(client._thread.is_alive() for client in clients) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert all(client._loop.is_closed() for client in clients)
+    run(scenario)
@@ -0,0 +1,78 @@
+"""
+    Fixed-size transposition table keyed by Board.zobrist.
+    Entries live in two preallocated arrays of unsigned 64-bit ints (key, packed data), so the memory used is
+    set once by the MB budget and never grows. Every bucket has two entries: a depth-preferred one and an
+    always-replace one.
+"""
+from array import array
+
+
+EXACT, LOWER, UPPER = 1, 2, 3 # bound types
+
+ENTRY_SIZE = 16 # bytes: key + data
+BUCKET_SIZE = 2
+
+# data layout: move key (Chess.MOVE_KEY_MASK bits of the packed move) 0-15, depth 16-23, bound 24-25, generation 26-31, score + 2**31 32-63
+_SCORE_OFFSET = 1 << 31
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: float = 16):
+        buckets = max(1, int(size_mb * 1024 * 1024) // (ENTRY_SIZE * BUCKET_SIZE))
+        # power of two, so the bucket is found with a mask
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(8 * buckets * BUCKET_SIZE))
+        self.data = array('Q', bytes(8 * buckets * BUCKET_SIZE))
+        self.generation = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.keys) * ENTRY_SIZE
+
+    def clear(self) -> None:
+        self.keys = array('Q', bytes(8 * len(self.keys)))
+        self.data = array('Q', bytes(8 * len(self.data)))
+        self.generation = 0
+
+    def new_search(self) -> None:
+        """ Entries from earlier searches become replaceable in the depth-preferred slot."""
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key: int):
+        """ Returns (depth, bound, score, move key or None) stored for the position or None."""
+        index = (key & self.mask) * BUCKET_SIZE
+        keys = self.keys
+        if keys[index] == key:
+            data = self.data[index]
+        elif keys[index + 1] == key:
+            data = self.data[index + 1]
+        else:
+            return None
+        if not data:
+            return None
+        move = data & 0xFFFF
+        return data >> 16 & 0xFF, data >> 24 & 3, (data >> 32) - _SCORE_OFFSET, move or None
+
+    def store(self, key: int, depth: int, bound: int, score: int, move_key: int = None) -> None:
+        index = (key & self.mask) * BUCKET_SIZE
+        data = self.data
+        old = data[index]
+        # the depth-preferred slot keeps the deeper entry of the current search, the other one always takes the new entry
+        if self.keys[index] == key or not old or depth >= (old >> 16 & 0xFF) or (old >> 26 & 63) != self.generation:
+            if self.keys[index] != key and old:
+                self.keys[index + 1], data[index + 1] = self.keys[index], old
+        else:
+            index += 1
+        if move_key is None and self.keys[index] == key:
+            move = data[index] & 0xFFFF # keep the best move of a shallower search of the position
+        else:
+            move = move_key & 0xFFFF if move_key else 0
+        self.keys[index] = key
+        data[index] = move | min(depth, 255) << 16 | bound << 24 | self.generation << 26 | (score + _SCORE_OFFSET) << 32
+
+    def hashfull(self) -> int:
+        """ Permille of the first thousand entries used by the current search."""
+        sample = min(1000, len(self.data))
+        used = sum(1 for d in self.data[:sample] if d and (d >> 26 & 63) == self.generation)
+        return used * 1000 // sample
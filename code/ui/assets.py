@@ -0,0 +1,59 @@
+"""
+    Asset cache: every image, font, rendered text and sound is loaded once, on first use. Images are converted
+    to the display's pixel format, so they are only cached once a display mode is set.
+"""
+import os
+import pygame
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+IMAGES_DIR = os.path.join(ASSETS_DIR, "images")
+FONTS_DIR = os.path.join(ASSETS_DIR, "fonts")
+AUDIO_DIR = os.path.join(ASSETS_DIR, "audio")
+
+_images = {}
+_fonts = {}
+_texts = {}
+_sounds = {}
+
+
+def image(name: str, alpha: bool = True, size: tuple = None) -> pygame.Surface:
+    """
+        An image of the images directory (name may start with a theme directory), alpha=False for opaque ones.
+        With a size the image is scaled once and the scaled copy is what is kept.
+    """
+    key = (name, alpha, size)
+    surface = _images.get(key)
+    if surface is None:
+        surface = pygame.image.load(os.path.join(IMAGES_DIR, name))
+        if size and surface.get_size() != size:
+            surface = pygame.transform.smoothscale(surface, size)
+        if pygame.display.get_surface() is None:
+            return surface # converting needs a display, the first call after set_mode caches it
+        surface = surface.convert_alpha() if alpha else surface.convert()
+        _images[key] = surface
+    return surface
+
+
+def font(name: str = None, size: int = 15) -> pygame.font.Font:
+    """ A font of the fonts directory, pygame's default font for None."""
+    key = (name, size)
+    if key not in _fonts:
+        _fonts[key] = pygame.font.Font(os.path.join(FONTS_DIR, name) if name else None, size)
+    return _fonts[key]
+
+
+def text(string: str, color, size: int = 15, font_name: str = None) -> pygame.Surface:
+    """ Rendered text, each string is rendered once per colour and font."""
+    key = (string, str(color), size, font_name)
+    surface = _texts.get(key)
+    if surface is None:
+        surface = font(font_name, size).render(string, 1, pygame.Color(color))
+        _texts[key] = surface
+    return surface
+
+
+def sound(name: str) -> pygame.mixer.Sound:
+    if name not in _sounds:
+        _sounds[name] = pygame.mixer.Sound(os.path.join(AUDIO_DIR, name))
+    return _sounds[name]
@@ -1,9 +1,10 @@
 import pygame
+from ui import assets
 pygame.font.init()
 
 
 class Button():
-    def __init__(self, pos, size, elevation, text='', font=pygame.font.Font(None, 15),
+    def __init__(self, pos, size, elevation, text='', font=None,
                  border_radius=0, img=None):
         self.border_radius = border_radius
         self.elevation = elevation
@@ -19,10 +20,11 @@ class Button():
         self.bottomrect = pygame.Rect(pos, (size[0], elevation))
         self.bottom_color = "#5C5C5C"
         
-        self.text_surf = font.render(text, 1, "white")
+        self.text_surf = (font or assets.font(None, 15)).render(text, 1, "white")
         self.text_rect = self.text_surf.get_rect(center=self.toprect.center)
         
         self.hover = "#8C8B8A"
+        self._drawn_state = None
         
         
 
@@ -40,20 +42,41 @@ class Button():
         if self.img:
             screen.blit(self.img, self.img.get_rect(center = self.toprect.center))
 
-    def check_click(self):
-        mouse_pos = pygame.mouse.get_pos()
-        right_click = pygame.mouse.get_pressed()[0]
-        if self.toprect.collidepoint(mouse_pos):
+    @property
+    def area(self) -> pygame.Rect:
+        """ Everything the button can cover, raised or pressed."""
+        return pygame.Rect(self.toprect.x, self.orginal_y_pos - self.elevation, self.toprect.width,
+                           self.toprect.height + self.elevation)
+
+    @property
+    def state(self) -> tuple:
+        return self.top_color, self.dynamic_elevation
+
+    def redraw(self, screen, background, force=False):
+        """ Renders the button over the background if it looks different from the last time, returns the dirty rect."""
+        if not force and self.state == self._drawn_state:
+            return None
+        self._drawn_state = self.state
+        area = self.area
+        screen.blit(background, area, area)
+        self.render(screen)
+        return area
+
+    def handle_event(self, event) -> bool:
+        """ Updates the hover and pressed look from a mouse event, True when the event is a left click on the button."""
+        if event.type not in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            return False
+        if self.toprect.collidepoint(event.pos):
             self.top_color = self.hover
-            if right_click and not self.pressed:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not self.pressed:
                 self.dynamic_elevation = 0
                 self.pressed = True
                 return True
-            if not right_click:
+            if event.type == pygame.MOUSEBUTTONUP:
                 self.pressed = False
                 self.dynamic_elevation = self.elevation
         else:
             self.top_color = "#757473"
+            self.pressed = False
             self.dynamic_elevation = self.elevation
-            
-        
\ No newline at end of file
+        return False
@@ -0,0 +1,32 @@
+"""
+    Rendering layer for pieces: maps a piece symbol to its surface in the current theme. A theme is a directory
+    of images/ with one image per piece, each image is loaded through the asset cache on first use.
+"""
+import pygame
+from config import SQUARE_SIZE
+from ui import assets
+
+
+THEMES = ["pieces", "chess theme glass"]
+_theme = THEMES[0]
+
+
+def set_theme(theme: str) -> None:
+    global _theme
+    if theme not in THEMES:
+        raise Exception(f"Unknown piece theme {theme}")
+    _theme = theme
+
+
+def next_theme() -> str:
+    set_theme(THEMES[(THEMES.index(_theme) + 1) % len(THEMES)])
+    return _theme
+
+
+def piece_image(piece_symbol: str) -> pygame.Surface:
+    color = 'w' if piece_symbol.isupper() else 'b'
+    return assets.image(f"{_theme}/{color}{piece_symbol.lower()}.png", size=(SQUARE_SIZE, SQUARE_SIZE))
+
+
+def render_piece(screen: pygame.Surface, piece_symbol: str, x: int, y: int) -> None:
+    screen.blit(piece_image(piece_symbol), (x, y))
@@ -0,0 +1,20 @@
+"""
+    Zobrist keys used by Board.zobrist.
+    The keys come from a fixed seed, so a position hashes the same in every run and every process.
+"""
+import random
+
+
+_rng = random.Random(0x5A0B)
+
+ZOBRIST_PIECES = {symbol: [_rng.getrandbits(64) for _ in range(64)] for symbol in "PNBRQKpnbrqk"}
+ZOBRIST_BLACK_TO_MOVE = _rng.getrandbits(64)
+_castling_right_keys = [_rng.getrandbits(64) for _ in range(4)]
+# indexed by the castling rights bitmask
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _i, _key in enumerate(_castling_right_keys):
+        if _rights & (1 << _i):
+            ZOBRIST_CASTLING[_rights] ^= _key
+# indexed by the file (column) of the en passant target
+ZOBRIST_EN_PASSANT = [_rng.getrandbits(64) for _ in range(8)]